@@ -0,0 +1,26 @@
+"""Access to the backend's shared LLM client for the desktop scripts.
+
+server_code/backend/llm_client.py is loaded straight from its file, so
+the backend directory never goes on sys.path and none of its other
+modules (metrics, utils, main, ...) can shadow or be shadowed by ours.
+It needs httpx and python-dotenv:
+
+    pip install httpx python-dotenv
+
+Servers are configured with LLM_API_URLS (default http://localhost:1234).
+"""
+import os
+import sys
+import importlib.util
+
+LLM_CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "..", "server_code", "backend", "llm_client.py")
+
+def _load_llm_client():
+    spec = importlib.util.spec_from_file_location("cohost_llm_client", LLM_CLIENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+get_llm_pool = _load_llm_client().get_llm_pool
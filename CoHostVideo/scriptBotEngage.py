@@ -1,7 +1,6 @@
 import os
 import time
 import threading
-import requests
 import pygame
 import cv2
 import numpy as np
@@ -9,9 +8,12 @@ import textwrap
 import asyncio
 import edge_tts  # New: using edge-tts for natural TTS
 
+# The shared LLM client (connection pooling, retries, health checks) lives in
+# the backend; llm.py loads it and lists what it needs.
+from llm import get_llm_pool
+
 # ---------- CONFIGURATION ----------
 SCRIPT_FILE = "script.txt"
-LLM_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
 MODEL_NAME = "llama-3.2-3b-instruct"
 
 # Initial window sizes
@@ -60,8 +62,8 @@ Format your response as bullet points.
         "max_tokens": 150
     }
     try:
-        response = requests.post(LLM_API_URL, json=payload)
-        suggestions = response.json()["choices"][0]["message"]["content"].strip()
+        response = get_llm_pool().chat(payload)
+        suggestions = response["choices"][0]["message"]["content"].strip()
     except Exception as e:
         suggestions = f"[LLM Error] {e}"
     return suggestions
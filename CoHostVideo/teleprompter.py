@@ -1,10 +1,12 @@
-import requests
 import time
 import os
 
+# The shared LLM client (connection pooling, retries, health checks) lives in
+# the backend; llm.py loads it and lists what it needs.
+from llm import get_llm_pool
+
 # CONFIGURATION
 SCRIPT_FILE = "script.txt"
-LLM_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
 MODEL_NAME = "llama-3.2-3b-instruct"
 
 def load_script(script_file):
@@ -39,8 +41,8 @@ Format your response as bullet points.
         "max_tokens": 150
     }
     try:
-        response = requests.post(LLM_API_URL, json=payload)
-        suggestions = response.json()["choices"][0]["message"]["content"].strip()
+        response = get_llm_pool().chat(payload)
+        suggestions = response["choices"][0]["message"]["content"].strip()
         return suggestions
     except Exception as e:
         return f"[LLM Error] {e}"
@@ -0,0 +1,95 @@
+"""Checks that independent requests don't serialize behind each other.
+
+Uses the fakes from fakes.py and the in-process app, like load_test.py.
+
+1. Head-of-line blocking: while slow /api/search requests are running,
+   cheap requests (/api/search/local, /api/youtube/quota) should still
+   answer in milliseconds. If a search blocked the event loop they would
+   wait for it.
+2. Overlap: N concurrent /api/generate-content requests should take about
+   as long as one (bounded by LLM slots), not N times as long.
+
+Run from server_code/backend:  python benchmarks/bench_concurrency.py
+Exits non-zero when either check fails, so it can gate changes.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SLOW_SEARCHES = 2
+QUICK_REQUESTS = 20
+QUICK_LIMIT_SECONDS = 0.5
+PARALLEL_GENERATIONS = 4
+# Concurrent wall time must stay under this fraction of running them one by one.
+OVERLAP_LIMIT = 0.6
+
+def content_request(i):
+    from fakes import FakeTranscriptApi
+    latency, FakeTranscriptApi.latency = FakeTranscriptApi.latency, 0
+    videos = [{"video_id": f"conc-{i}-{n}",
+               "transcript": " ".join(seg["text"] for seg in FakeTranscriptApi.get_transcript(f"conc-{i}-{n}"))}
+              for n in range(2)]
+    FakeTranscriptApi.latency = latency
+    return {"videos": videos, "use_cache": False}
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+async def head_of_line(client):
+    searches = [asyncio.create_task(timed(client.post("/api/search", json={"keyword": f"slow search {i}"})))
+                for i in range(SLOW_SEARCHES)]
+    await asyncio.sleep(0.2)
+    quick = []
+    while not all(task.done() for task in searches) and len(quick) < QUICK_REQUESTS:
+        quick.append(await timed(client.post("/api/search/local", json={"keyword": "anything"})))
+        quick.append(await timed(client.get("/api/youtube/quota")))
+        await asyncio.sleep(0.05)
+    search_times = await asyncio.gather(*searches)
+    worst = max(quick) if quick else float("nan")
+    print(f"slow searches took {max(search_times):.2f}s; {len(quick)} quick requests during them, "
+          f"worst {worst * 1000:.1f} ms")
+    return bool(quick) and worst < QUICK_LIMIT_SECONDS
+
+async def overlap(client):
+    bodies = [content_request(i) for i in range(PARALLEL_GENERATIONS * 2)]
+    serial = 0.0
+    for body in bodies[:PARALLEL_GENERATIONS]:
+        serial += await timed(client.post("/api/generate-content", json=body))
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(client.post("/api/generate-content", json=body))
+                           for body in bodies[PARALLEL_GENERATIONS:]))
+    concurrent = time.perf_counter() - start
+    print(f"{PARALLEL_GENERATIONS} x /api/generate-content: one by one {serial:.2f}s, "
+          f"concurrently {concurrent:.2f}s ({concurrent / serial:.0%})")
+    return concurrent < serial * OVERLAP_LIMIT
+
+async def run():
+    import httpx
+    import main
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                 timeout=600) as client:
+        return [await head_of_line(client), await overlap(client)]
+
+def main():
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="cohost-bench-"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from fakes import FakeLLMServer, FakeYouTube, FakeTranscriptApi, install
+    llm = FakeLLMServer(first_token_latency=0.2, tokens_per_second=400, slots=8).start()
+    os.environ["LLM_API_URLS"] = llm.url
+    os.environ.setdefault("LLM_PARALLEL_SLOTS", "8")
+    FakeTranscriptApi.latency = 0.3
+    install(youtube=FakeYouTube(latency=0.3))
+
+    passed = asyncio.run(run())
+    print("PASS" if all(passed) else "FAIL")
+    sys.exit(0 if all(passed) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Micro-benchmark of dialogue parsing on large completions.
+
+Compares the previous regex-based format_json with the incremental
+DialogueParser, both on the whole text and fed in small streaming chunks.
+
+Run from server_code/backend:  python benchmarks/bench_format_json.py
+"""
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import DialogueParser, format_json, format_exchanges
+
+CHUNK_SIZE = 16  # roughly a few tokens per streamed delta
+REPEATS = 3
+
+def legacy_format_json(input_str):
+    json_blocks = re.findall(r'\[\s*{.*?}\s*\]', input_str, re.DOTALL)
+    combined_dialogs = []
+    formatted_str = ''
+    for block in json_blocks:
+        try:
+            combined_dialogs.extend(json.loads(block))
+        except Exception:
+            pass
+    for pair in combined_dialogs:
+        for speaker, line in pair.items():
+            formatted_str += f"{speaker}: {line}\n\n"
+    return formatted_str
+
+def streamed_format_json(text):
+    parser = DialogueParser()
+    exchanges = []
+    for i in range(0, len(text), CHUNK_SIZE):
+        exchanges.extend(parser.feed(text[i:i + CHUNK_SIZE]))
+    exchanges.extend(parser.close())
+    return format_exchanges(exchanges)
+
+def legacy_streamed_format_json(text):
+    # Without an incremental parser, streaming means re-parsing the whole
+    # buffer after every delta.
+    for i in range(CHUNK_SIZE, len(text) + CHUNK_SIZE, CHUNK_SIZE):
+        result = legacy_format_json(text[:i])
+    return result
+
+def make_completion(exchanges):
+    dialogue = [{"Human": f"Question {i} about {{topics}} and \"quotes\"?" * 3,
+                 "Bot": f"Answer {i}, with a witty remark." * 3} for i in range(exchanges)]
+    return "Here is your script:\n" + json.dumps(dialogue, indent=2) + "\nHope this helps!"
+
+def best_of(fn, text):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    print(f"{'exchanges':>9} {'size (KB)':>9} {'legacy (ms)':>12} {'parser (ms)':>12} "
+          f"{'legacy streamed (ms)':>21} {'parser streamed (ms)':>21}")
+    for count in (10, 100, 1000, 10000):
+        text = make_completion(count)
+        assert format_json(text) == legacy_format_json(text)
+        # Re-parsing per delta is quadratic; skip it where it would take minutes.
+        legacy_streamed = f"{best_of(legacy_streamed_format_json, text):.2f}" if count <= 100 else "-"
+        print(f"{count:>9} {len(text) / 1024:>9.0f} {best_of(legacy_format_json, text):>12.2f} "
+              f"{best_of(format_json, text):>12.2f} {legacy_streamed:>21} {best_of(streamed_format_json, text):>21.2f}")
+
+if __name__ == "__main__":
+    main()
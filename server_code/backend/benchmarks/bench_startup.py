@@ -0,0 +1,56 @@
+"""Startup cost of the backend: import time of main.py and first-request latency.
+
+Each measurement runs in a fresh interpreter so nothing is cached in-process.
+Run from server_code/backend:  python benchmarks/bench_startup.py
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUNS = 5
+
+IMPORT_PROBE = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+# First request to an endpoint that needs no heavy client, then the cost of
+# building every client through /api/warmup, then a warm repeat.
+REQUEST_PROBE = """
+import time, json
+from fastapi.testclient import TestClient
+import main
+client = TestClient(main.app)
+timings = {}
+for label, method, path in (
+    ("first GET /api/warmup", "get", "/api/warmup"),
+    ("first GET /api/youtube/quota", "get", "/api/youtube/quota"),
+    ("cold POST /api/warmup", "post", "/api/warmup"),
+    ("warm POST /api/warmup", "post", "/api/warmup"),
+):
+    start = time.perf_counter()
+    getattr(client, method)(path)
+    timings[label] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+def run_probe(code):
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, check=True,
+                            capture_output=True, text=True).stdout
+    return output.strip().splitlines()[-1]
+
+def main():
+    imports = [float(run_probe(IMPORT_PROBE)) for _ in range(RUNS)]
+    print(f"import main: median {statistics.median(imports) * 1000:.0f} ms over {RUNS} runs")
+
+    requests = [json.loads(run_probe(REQUEST_PROBE)) for _ in range(RUNS)]
+    for label in requests[0]:
+        print(f"{label}: median {statistics.median(r[label] for r in requests) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Wall time of the transcript fetch stage against a local fake transcript source.
+
+Run from server_code/backend:  python benchmarks/bench_transcripts.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcript_utils import fetch_transcripts, TRANSCRIPT_FETCH_CONCURRENCY
+
+FETCH_LATENCY_SECONDS = (0.2, 0.6)   # typical transcript round trip
+SLOW_VIDEO_RATIO = 0.05              # videos that hang well past the timeout
+SLOW_VIDEO_SECONDS = 30.0
+TIMEOUT_SECONDS = 2.0
+
+def fake_transcript_source(seed, slow_ratio=SLOW_VIDEO_RATIO):
+    rng = random.Random(seed)
+    slow = set()
+
+    def fetch(video_id):
+        if video_id in slow or rng.random() < slow_ratio:
+            slow.add(video_id)
+            time.sleep(SLOW_VIDEO_SECONDS)
+        else:
+            time.sleep(rng.uniform(*FETCH_LATENCY_SECONDS))
+        return "lorem ipsum " * 200
+
+    return fetch
+
+def serial(video_ids, fetch):
+    return {video_id: fetch(video_id) for video_id in video_ids}
+
+def main():
+    print(f"{'candidates':>10} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+    for count in (5, 10, 25, 50):
+        video_ids = [f"vid{i:03d}" for i in range(count)]
+
+        # The serial path has no timeout, so keep hanging videos out of it.
+        start = time.perf_counter()
+        serial(video_ids, fake_transcript_source(count, slow_ratio=0.0))
+        serial_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fetch_transcripts(video_ids, max_workers=TRANSCRIPT_FETCH_CONCURRENCY,
+                          timeout=TIMEOUT_SECONDS, fetch=fake_transcript_source(count))
+        parallel_seconds = time.perf_counter() - start
+
+        print(f"{count:>10} {serial_seconds:>11.2f} {parallel_seconds:>13.2f} {serial_seconds / parallel_seconds:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
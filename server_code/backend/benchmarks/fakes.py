@@ -0,0 +1,244 @@
+"""Local stand-ins for the backend's external services, for benchmarks.
+
+- FakeYouTube: shaped like googleapiclient's youtube v3 client (search, videos)
+- FakeTranscriptApi: shaped like youtube_transcript_api.YouTubeTranscriptApi
+- FakeLLMServer: an OpenAI-compatible HTTP server (/v1/chat/completions with
+  and without streaming, /v1/models) with configurable time to first token
+  and token rate
+- fake_encode: deterministic unit vectors in place of the embedding model
+
+Everything is deterministic for a given query or video id, so runs are
+comparable. `install(...)` wires the fakes into the backend modules.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = ("video", "topic", "creator", "camera", "story", "growth", "audience", "editing", "script", "channel",
+         "light", "sound", "market", "recipe", "travel", "coding", "design", "music", "review", "budget")
+
+def seeded(*parts):
+    return random.Random(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest())
+
+class _Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+class FakeYouTube:
+    """Search returns `videos_per_query` ids per query, spread over `channels` channels.
+
+    About `short_ratio` of the videos are under the pipeline's minimum duration.
+    """
+
+    def __init__(self, latency=0.15, videos_per_query=50, channels=12, short_ratio=0.2):
+        self.latency = latency
+        self.videos_per_query = videos_per_query
+        self.channels = channels
+        self.short_ratio = short_ratio
+
+    def search(self):
+        return self
+
+    def videos(self):
+        return self
+
+    def list(self, **params):
+        if "q" in params:
+            return _Request(lambda: self._search(params))
+        return _Request(lambda: self._videos(params["id"].split(",")))
+
+    def _search(self, params):
+        time.sleep(self.latency)
+        start = int(params.get("pageToken") or 0)
+        count = min(params.get("maxResults", 5), self.videos_per_query - start)
+        query_id = hashlib.sha1(params["q"].encode()).hexdigest()[:8]
+        items = [{"id": {"kind": "youtube#video", "videoId": f"{query_id}-{start + i:03d}"},
+                  "snippet": {"title": f"{params['q']} #{start + i}"}} for i in range(count)]
+        response = {"items": items}
+        if start + count < self.videos_per_query:
+            response["nextPageToken"] = str(start + count)
+        return response
+
+    def _videos(self, ids):
+        time.sleep(self.latency)
+        items = []
+        for video_id in ids:
+            rng = seeded("video", video_id)
+            minutes = rng.randint(1, 3) if rng.random() < self.short_ratio else rng.randint(5, 40)
+            channel = rng.randrange(self.channels)
+            items.append({
+                "id": video_id,
+                "snippet": {
+                    "title": " ".join(rng.choices(WORDS, k=6)),
+                    "description": " ".join(rng.choices(WORDS, k=30)),
+                    "channelId": f"channel-{channel}",
+                    "channelTitle": f"Channel {channel}"
+                },
+                "statistics": {"viewCount": str(rng.randint(1_000, 5_000_000))},
+                "contentDetails": {"duration": f"PT{minutes}M{rng.randint(0, 59)}S"}
+            })
+        return {"items": items}
+
+class FakeTranscriptApi:
+    """About `missing_ratio` of videos have no captions; the rest have `words` words.
+
+    `FakeTranscriptApi(http_client=...).fetch(video_id)` mirrors the real
+    client; the classmethod get_transcript returns the raw segment dicts.
+    """
+
+    latency = 0.3
+    words = 1500
+    missing_ratio = 0.1
+
+    def __init__(self, http_client=None):
+        self.http_client = http_client
+
+    def fetch(self, video_id, languages=("en",)):
+        return [SimpleNamespace(**segment) for segment in self.get_transcript(video_id, languages)]
+
+    @classmethod
+    def get_transcript(cls, video_id, languages=None):
+        time.sleep(cls.latency)
+        rng = seeded("transcript", video_id)
+        if rng.random() < cls.missing_ratio:
+            return []
+        words = rng.choices(WORDS, k=cls.words)
+        return [{"text": " ".join(words[i:i + 12]), "start": i / 3, "duration": 4.0}
+                for i in range(0, len(words), 12)]
+
+def fake_completion(tokens):
+    exchanges = []
+    used = 2
+    while used < tokens:
+        line = " ".join(WORDS[(used + i) % len(WORDS)] for i in range(8))
+        exchanges.append({"Human": line, "Bot": line})
+        used += 20
+    return json.dumps(exchanges)
+
+class FakeLLMServer:
+    """OpenAI-compatible completion server on 127.0.0.1:`port` (0 picks a free port).
+
+    A completion of `tokens` tokens (capped by the request's max_tokens)
+    takes `first_token_latency + tokens / tokens_per_second` seconds; streams
+    send one token-sized delta per tick. `slots` requests are served at once,
+    the rest wait, like an LM Studio / llama.cpp server with N parallel slots.
+    """
+
+    def __init__(self, port=0, first_token_latency=0.3, tokens_per_second=60, tokens=300, slots=4):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.slots = threading.Semaphore(slots)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._json({"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                tokens = min(server.tokens, body.get("max_tokens", server.tokens))
+                content = fake_completion(tokens)
+                with server.slots:
+                    time.sleep(server.first_token_latency)
+                    if body.get("stream"):
+                        self._stream(content, tokens)
+                    else:
+                        time.sleep(tokens / server.tokens_per_second)
+                        self._json({"choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                                 "finish_reason": "stop"}],
+                                    "usage": {"prompt_tokens": len(json.dumps(body)) // 4,
+                                              "completion_tokens": tokens}})
+
+            def _json(self, data):
+                out = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _stream(self, content, tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                step = max(1, len(content) // tokens)
+                for i in range(0, len(content), step):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + step]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(1 / server.tokens_per_second)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+def fake_encode(texts, batch_size=None):
+    from embedding_service import EMBEDDING_DIM
+    out = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split()[:256]:
+            out[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % EMBEDDING_DIM] += 1
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms == 0, 1, norms)
+
+def install(youtube=None, transcript_api=FakeTranscriptApi, fake_embeddings=None):
+    """Point the backend at the fakes. Call before the first request.
+
+    LLM_API_URLS must already be set in the environment (see FakeLLMServer.url)
+    before llm_client is imported. `fake_embeddings=None` uses the real model
+    when sentence-transformers is installed and fake_encode otherwise.
+    """
+    import main
+    import youtube_utils
+    import transcript_utils
+    import embedding_service
+    from utils import lazy_singleton
+    from youtube_api import CachedYouTubeClient
+
+    youtube = youtube or FakeYouTube()
+    get_youtube_api = lazy_singleton(lambda: CachedYouTubeClient(youtube))
+    youtube_utils.get_youtube_api = get_youtube_api
+    main.get_youtube_api = get_youtube_api
+    transcript_utils.YouTubeTranscriptApi = transcript_api
+
+    if fake_embeddings is None:
+        try:
+            import sentence_transformers  # noqa: F401
+            fake_embeddings = False
+        except ImportError:
+            fake_embeddings = True
+    if fake_embeddings:
+        embedding_service.encode_normalized = fake_encode
+    return {"fake_embeddings": fake_embeddings}
@@ -0,0 +1,151 @@
+"""Offline load test of the backend API against local fakes.
+
+YouTube, transcripts and the LLM server are replaced by the stand-ins in
+fakes.py, so no keys or network are needed. The FastAPI app runs in-process
+behind httpx's ASGI transport, and each endpoint is driven at every
+requested concurrency level. Reports requests/s and p50/p95/p99 latency.
+
+Run from server_code/backend:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --endpoints search --concurrency 1 8 32 --requests 64
+    python benchmarks/load_test.py --llm-tokens-per-second 30 --json baseline.json
+
+Each request searches a distinct keyword and asks for uncached scripts, so
+the numbers measure the full pipeline; pass --repeat-keywords to measure
+the cached/coalesced path instead. Caches live in a temporary CACHE_DIR.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ("search", "search-local", "generate-content", "generate-content-stream")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    # Nearest-rank percentile.
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint and concurrency level")
+    parser.add_argument("--repeat-keywords", action="store_true", help="reuse one keyword so caches are hit")
+    parser.add_argument("--youtube-latency", type=float, default=0.15)
+    parser.add_argument("--transcript-latency", type=float, default=0.3)
+    parser.add_argument("--transcript-words", type=int, default=1500)
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.3)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=60)
+    parser.add_argument("--llm-slots", type=int, default=4, help="parallel slots of the fake LLM server")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="hash-based embeddings even when sentence-transformers is installed")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+def request_for(endpoint, i, args):
+    keyword = "benchmark topic" if args.repeat_keywords else f"benchmark topic {i}"
+    if endpoint == "search":
+        return "/api/search", {"keyword": keyword}
+    if endpoint == "search-local":
+        return "/api/search/local", {"keyword": keyword}
+    from fakes import FakeTranscriptApi
+    videos = [{"video_id": f"bench-{i}-{n}",
+               "transcript": " ".join(seg["text"] for seg in FakeTranscriptApi.get_transcript(f"bench-{i}-{n}"))}
+              for n in range(3)]
+    path = "/api/generate-content/stream" if endpoint == "generate-content-stream" else "/api/generate-content"
+    return path, {"videos": videos, "use_cache": args.repeat_keywords}
+
+async def run_level(client, endpoint, concurrency, args, offset):
+    # Bodies are built up front so fake transcript latency isn't timed.
+    from fakes import FakeTranscriptApi
+    latency, FakeTranscriptApi.latency = FakeTranscriptApi.latency, 0
+    bodies = [request_for(endpoint, offset + i, args) for i in range(args.requests)]
+    FakeTranscriptApi.latency = latency
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            path, body = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(bodies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / len(latencies) if latencies else float("nan")
+    }
+
+async def run(args):
+    import httpx
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    print(f"{'endpoint':<24} {'conc':>4} {'reqs':>5} {'err':>4} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        offset = 0
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                result = await run_level(client, endpoint, concurrency, args, offset)
+                offset += args.requests
+                results.append(result)
+                print(f"{endpoint:<24} {concurrency:>4} {result['requests']:>5} {result['errors']:>4} "
+                      f"{result['rps']:>8.2f} {result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f}")
+    return results
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="cohost-bench-"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from fakes import FakeLLMServer, FakeYouTube, FakeTranscriptApi, install
+    llm = FakeLLMServer(first_token_latency=args.llm_first_token_latency,
+                        tokens_per_second=args.llm_tokens_per_second, slots=args.llm_slots).start()
+    os.environ["LLM_API_URLS"] = llm.url
+    FakeTranscriptApi.latency = args.transcript_latency
+    FakeTranscriptApi.words = args.transcript_words
+    setup = install(youtube=FakeYouTube(latency=args.youtube_latency),
+                    fake_embeddings=True if args.fake_embeddings else None)
+    print(f"[INFO] caches in {os.environ['CACHE_DIR']}, LLM at {llm.url}, "
+          f"{'fake' if setup['fake_embeddings'] else 'real'} embeddings")
+
+    results = asyncio.run(run(args))
+    print(f"[INFO] fake LLM served {llm.requests} completions")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""On-disk cache of BGM preview audio.
+
+Files are stored by the SHA-256 of their content under
+CACHE_DIR/audio/blobs, so the same preview reached through different URLs
+is kept once. A small SQLite table maps each URL (by `url_key`) to its blob
+and tracks sizes. URLs are registered before they are downloaded, so a
+key handed to a client can always be resolved. Once the blobs exceed
+BGM_AUDIO_CACHE_MAX_BYTES the least recently used ones are deleted.
+
+Downloads are written to a .part file first. An interrupted download is
+resumed with a `Range: bytes=<size>-` request when the server supports it,
+and restarted otherwise.
+"""
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from cache_utils import CACHE_DIR
+from utils import lazy_singleton
+from metrics import counter
+
+log = logging.getLogger(__name__)
+
+BGM_AUDIO_CACHE_MAX_BYTES = int(os.getenv("BGM_AUDIO_CACHE_MAX_BYTES", str(1024 ** 3)))
+BGM_DOWNLOAD_WORKERS = 4
+BGM_DOWNLOAD_TIMEOUT = (5, 30)
+BGM_DOWNLOAD_RETRIES = 2
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+BGM_DOWNLOADED_BYTES = counter("cohost_bgm_downloaded_bytes_total", "Bytes of BGM preview audio downloaded.")
+
+def url_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    def __init__(self, root=None, max_bytes=BGM_AUDIO_CACHE_MAX_BYTES, max_workers=BGM_DOWNLOAD_WORKERS):
+        self.root = root or os.path.join(CACHE_DIR, "audio")
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.partial_dir = os.path.join(self.root, "partial")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        # One lock per URL so concurrent requests for a preview share a download.
+        self._url_locks = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bgm-download")
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, sha256 TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at)")
+        self._conn.commit()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}.mp3")
+
+    def lookup(self, key):
+        """Return the cached file path for a url_key, or None if it is not cached."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM urls WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            path = self.blob_path(row[0])
+            if not os.path.exists(path):
+                self._conn.execute("UPDATE urls SET sha256 = NULL WHERE sha256 = ?", (row[0],))
+                self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (row[0],))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE sha256 = ?", (time.time(), row[0]))
+            self._conn.commit()
+            return path
+
+    def register(self, urls):
+        """Remember `urls` so their keys resolve; returns {url: key}."""
+        keys = {url: url_key(url) for url in urls}
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO urls (key, url) VALUES (?, ?)",
+                                   [(key, url) for url, key in keys.items()])
+            self._conn.commit()
+        return keys
+
+    def url_for_key(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT url FROM urls WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def fetch(self, url):
+        """Return the local path of `url`, downloading it first if needed."""
+        key = url_key(url)
+        path = self.lookup(key)
+        if path:
+            return path
+        with self._lock:
+            url_lock = self._url_locks.setdefault(key, threading.Lock())
+        with url_lock:
+            path = self.lookup(key)
+            if path:
+                return path
+            for attempt in range(BGM_DOWNLOAD_RETRIES + 1):
+                try:
+                    return self._download(url, key)
+                except requests.RequestException as e:
+                    if attempt == BGM_DOWNLOAD_RETRIES:
+                        raise
+                    log.debug("Retrying BGM download %s after error: %s", url, e)
+
+    def prefetch(self, urls):
+        """Start downloading `urls` in the background; returns the futures."""
+        self.register(urls)
+        return [self._pool.submit(self._prefetch_one, url) for url in dict.fromkeys(urls)]
+
+    def _prefetch_one(self, url):
+        try:
+            return self.fetch(url)
+        except Exception as e:
+            log.error("Could not prefetch BGM preview %s: %s", url, e)
+            return None
+
+    def _download(self, url, key):
+        part = os.path.join(self.partial_dir, f"{key}.part")
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=BGM_DOWNLOAD_TIMEOUT) as response:
+            if not (offset and response.status_code == 416):
+                # 416 on a resume means the partial file already holds everything.
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    offset = 0
+                expected = response.headers.get("Content-Length")
+                received = 0
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                        f.write(chunk)
+                        received += len(chunk)
+                BGM_DOWNLOADED_BYTES.inc(received)
+                if expected is not None and received < int(expected):
+                    # Keep the .part file; the retry resumes from here.
+                    raise requests.ConnectionError(f"Connection closed after {received} of {expected} bytes")
+
+        digest = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(part)
+        os.replace(part, path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO blobs (sha256, size, accessed_at) VALUES (?, ?, ?)",
+                               (sha256, size, time.time()))
+            self._conn.execute("INSERT OR REPLACE INTO urls (key, url, sha256) VALUES (?, ?, ?)", (key, url, sha256))
+            self._evict(keep=sha256)
+            self._conn.commit()
+        return path
+
+    def _evict(self, keep=None):
+        # `keep` is the blob just written: the caller is about to serve it, so
+        # it stays even when it alone exceeds max_bytes.
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT sha256, size FROM blobs WHERE sha256 IS NOT ? ORDER BY accessed_at",
+                                  (keep,)).fetchall()
+        for sha256, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.blob_path(sha256))
+            except FileNotFoundError:
+                pass
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self._conn.execute("UPDATE urls SET sha256 = NULL WHERE sha256 = ?", (sha256,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            files, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"files": files, "bytes": size, "max_bytes": self.max_bytes}
+
+@lazy_singleton
+def get_audio_cache():
+    return AudioCache()
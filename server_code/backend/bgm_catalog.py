@@ -0,0 +1,208 @@
+"""Local catalog of background-music sounds with keyword and semantic search.
+
+Every sound Freesound returns is kept here (name, tags, duration, preview
+URL), and whole collections can be bulk-imported:
+
+    python bgm_catalog.py import sounds.json   # or .jsonl / .csv
+
+Keyword search uses an SQLite FTS5 index over name and tags; semantic
+search embeds "name + tags" with the shared embedder and looks it up in a
+VectorIndex. The two rankings are merged with reciprocal rank fusion.
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import logging
+import sqlite3
+import threading
+from cache_utils import CACHE_DIR
+from embedding_service import get_embedder
+from vector_index import VectorIndex
+from utils import lazy_singleton
+
+log = logging.getLogger(__name__)
+
+BGM_MIN_DURATION_SECONDS = 30
+BGM_MAX_DURATION_SECONDS = 300
+# Weight damping for reciprocal rank fusion; 60 is the usual choice.
+RRF_K = 60
+# Semantic hits below this cosine similarity are not counted as matches, so
+# an unrelated theme still finds "too few" local sounds and asks Freesound.
+BGM_MIN_SIMILARITY = 0.35
+WORD = re.compile(r"\w+")
+
+def sound_text(sound):
+    return f"{sound['name']} {' '.join(sound.get('tags', []))}"
+
+class BGMCatalog:
+    def __init__(self, path=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = path or os.path.join(CACHE_DIR, "bgm_catalog.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sounds ("
+            " id TEXT PRIMARY KEY, name TEXT NOT NULL, tags TEXT NOT NULL,"
+            " duration REAL, preview_url TEXT NOT NULL, url TEXT,"
+            " source TEXT NOT NULL, added_at REAL NOT NULL)"
+        )
+        try:
+            self._create_fts()
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; keyword search falls back to LIKE.
+            self.has_fts = False
+        self._conn.commit()
+        self.vectors = VectorIndex("bgm")
+
+    def _create_fts(self):
+        # External-content index over sounds, kept in sync by triggers and
+        # keyed by the sounds rowid, so updates touch one FTS row by rowid.
+        existing = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'sounds_fts'"
+        ).fetchone()
+        if existing and "content=" not in existing[0]:
+            # Older catalogs kept their own copy keyed by an UNINDEXED id column.
+            self._conn.execute("DROP TABLE sounds_fts")
+            existing = None
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS sounds_fts USING fts5(name, tags, content='sounds', content_rowid='rowid')"
+        )
+        self._conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS sounds_fts_insert AFTER INSERT ON sounds BEGIN
+                INSERT INTO sounds_fts (rowid, name, tags) VALUES (new.rowid, new.name, new.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sounds_fts_delete AFTER DELETE ON sounds BEGIN
+                INSERT INTO sounds_fts (sounds_fts, rowid, name, tags) VALUES ('delete', old.rowid, old.name, old.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sounds_fts_update AFTER UPDATE ON sounds BEGIN
+                INSERT INTO sounds_fts (sounds_fts, rowid, name, tags) VALUES ('delete', old.rowid, old.name, old.tags);
+                INSERT INTO sounds_fts (rowid, name, tags) VALUES (new.rowid, new.name, new.tags);
+            END;
+        """)
+        if existing is None:
+            self._conn.execute("INSERT INTO sounds_fts (sounds_fts) VALUES ('rebuild')")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sounds").fetchone()[0]
+
+    def add(self, sounds, source="freesound"):
+        """Insert or update sounds given as dicts with id, name, tags, duration, preview_url and url."""
+        sounds = [s for s in sounds if s.get("id") and s.get("name") and s.get("preview_url")]
+        if not sounds:
+            return 0
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: REPLACE deletes without
+            # firing the FTS delete trigger.
+            self._conn.executemany(
+                "INSERT INTO sounds (id, name, tags, duration, preview_url, url, source, added_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET name = excluded.name, tags = excluded.tags,"
+                "  duration = excluded.duration, preview_url = excluded.preview_url, url = excluded.url,"
+                "  source = excluded.source, added_at = excluded.added_at",
+                [(str(sound["id"]), sound["name"], " ".join(sound.get("tags", [])), sound.get("duration"),
+                  sound["preview_url"], sound.get("url"), sound.get("source", source), now) for sound in sounds]
+            )
+            self._conn.commit()
+        try:
+            embeddings = get_embedder().encode([sound_text(s) for s in sounds])
+            self.vectors.add([str(s["id"]) for s in sounds], embeddings, [{} for _ in sounds])
+        except Exception as e:
+            log.error("Could not embed %d BGM sounds: %s", len(sounds), e)
+        return len(sounds)
+
+    def keyword_search(self, query, limit):
+        words = WORD.findall(query.lower())
+        if not words:
+            return []
+        with self._lock:
+            if self.has_fts:
+                match = " OR ".join(f'"{word}"*' for word in words)
+                rows = self._conn.execute(
+                    "SELECT sounds.id FROM sounds_fts JOIN sounds ON sounds.rowid = sounds_fts.rowid"
+                    " WHERE sounds_fts MATCH ? ORDER BY bm25(sounds_fts) LIMIT ?",
+                    (match, limit)
+                ).fetchall()
+            else:
+                where = " OR ".join("(name LIKE ? OR tags LIKE ?)" for _ in words)
+                params = [f"%{word}%" for word in words for _ in range(2)]
+                rows = self._conn.execute(f"SELECT id FROM sounds WHERE {where} LIMIT ?", params + [limit]).fetchall()
+        return [row[0] for row in rows]
+
+    def semantic_search(self, query, limit):
+        if len(self.vectors) == 0:
+            return []
+        query_embedding = get_embedder().encode([query])[0]
+        return [sound_id for sound_id, score, _ in self.vectors.search(query_embedding, k=limit)
+                if score >= BGM_MIN_SIMILARITY]
+
+    def search(self, query, limit=15, min_duration=BGM_MIN_DURATION_SECONDS, max_duration=BGM_MAX_DURATION_SECONDS,
+               semantic=True):
+        """Return up to `limit` sounds matching `query`, best first.
+
+        `semantic=False` skips the embedding lookup and ranks by keywords only.
+        """
+        # Over-fetch from both rankings so the duration filter still leaves enough.
+        depth = limit * 4
+        scores = {}
+        rankings = [self.keyword_search(query, depth)]
+        if semantic:
+            try:
+                rankings.append(self.semantic_search(query, depth))
+            except Exception as e:
+                log.error("BGM semantic search failed, using keyword results only: %s", e)
+        for ranking in rankings:
+            for rank, sound_id in enumerate(ranking):
+                scores[sound_id] = scores.get(sound_id, 0) + 1 / (RRF_K + rank + 1)
+        if not scores:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, name, tags, duration, preview_url, url, source FROM sounds"
+                f" WHERE id IN ({','.join('?' * len(scores))})", list(scores)
+            ).fetchall()
+        sounds = [
+            {"id": sound_id, "name": name, "tags": tags.split(), "duration": duration,
+             "preview_url": preview_url, "url": url, "source": source}
+            for sound_id, name, tags, duration, preview_url, url, source in rows
+            if duration is None or min_duration <= duration <= max_duration
+        ]
+        sounds.sort(key=lambda s: scores[s["id"]], reverse=True)
+        return sounds[:limit]
+
+    def import_file(self, path, source="import"):
+        """Bulk-load sounds from a .json (list), .jsonl or .csv file; tags may be a list or space separated."""
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith(".csv"):
+                sounds = list(csv.DictReader(f))
+            elif path.endswith(".jsonl"):
+                sounds = [json.loads(line) for line in f if line.strip()]
+            else:
+                sounds = json.load(f)
+        for sound in sounds:
+            if isinstance(sound.get("tags"), str):
+                sound["tags"] = sound["tags"].split()
+            if sound.get("duration") not in (None, ""):
+                sound["duration"] = float(sound["duration"])
+            else:
+                sound["duration"] = None
+        added = 0
+        for i in range(0, len(sounds), 500):
+            added += self.add(sounds[i:i + 500], source=source)
+        return added
+
+@lazy_singleton
+def get_bgm_catalog():
+    return BGMCatalog()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        sys.exit("usage: python bgm_catalog.py import <sounds.json|.jsonl|.csv>")
+    count = get_bgm_catalog().import_file(sys.argv[2])
+    print(f"[INFO] Imported {count} sounds, catalog now holds {len(get_bgm_catalog())}")
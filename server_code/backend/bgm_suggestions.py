@@ -1,20 +1,95 @@
 import os
-import freesound
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
+from utils import lazy_singleton
+from bgm_catalog import get_bgm_catalog, BGM_MIN_DURATION_SECONDS, BGM_MAX_DURATION_SECONDS
+from bgm_cache import get_audio_cache
+from embedding_service import embedder_ready
+from metrics import STAGE_SECONDS, counter
 
 load_dotenv()
-client = freesound.FreesoundClient()
-client.set_token(os.getenv("FREE_SOUND_API_KEY"), "token")
-print(client)
-print('----------------------')
+log = logging.getLogger(__name__)
 
-def get_bgm_suggestions(theme):
-    results = client.text_search(
+BGM_SUGGESTION_COUNT = 15
+# Below this many local matches Freesound is asked as well.
+BGM_MIN_LOCAL_RESULTS = int(os.getenv("BGM_MIN_LOCAL_RESULTS", "5"))
+BGM_FREESOUND_TIMEOUT_SECONDS = float(os.getenv("BGM_FREESOUND_TIMEOUT_SECONDS", "3"))
+
+BGM_LOOKUPS = counter("cohost_bgm_suggestions_total", "BGM suggestion requests by where the answer came from.",
+                      ["source"])
+
+# Freesound calls run here so a slow call can be abandoned by the request
+# while it finishes in the background and still lands in the catalog.
+freesound_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="freesound")
+# Writing and embedding Freesound results into the catalog may load the
+# embedding model, so it happens off the request path.
+catalog_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bgm-catalog")
+
+@lazy_singleton
+def get_freesound_client():
+    import freesound
+    client = freesound.FreesoundClient()
+    client.set_token(os.getenv("FREE_SOUND_API_KEY"), "token")
+    return client
+
+@STAGE_SECONDS.time(stage="bgm_freesound")
+def search_freesound(theme):
+    results = get_freesound_client().text_search(
         query=theme,
-        filter="duration:[30 TO 300]",
+        filter=f"duration:[{BGM_MIN_DURATION_SECONDS} TO {BGM_MAX_DURATION_SECONDS}]",
         sort="score",
-        fields="id,name,previews,url"
+        fields="id,name,tags,duration,previews,url",
+        page_size=BGM_SUGGESTION_COUNT
     )
+    sounds = [{
+        "id": f"freesound:{sound.id}",
+        "name": sound.name,
+        "tags": list(getattr(sound, "tags", None) or []),
+        "duration": getattr(sound, "duration", None),
+        "preview_url": sound.previews.preview_hq_mp3,
+        "url": getattr(sound, "url", None)
+    } for sound in results]
+    return sounds
+
+def store_freesound_results(future):
+    # Done-callback: runs even when the request stopped waiting for the call.
+    if not future.cancelled() and future.exception() is None:
+        catalog_pool.submit(get_bgm_catalog().add, future.result(), source="freesound")
+
+def get_bgm_suggestions(theme, prefetch=True):
+    catalog = get_bgm_catalog()
+    # Semantic ranking only once the embedder is warm; a cold model load
+    # would cost seconds here, keyword matches cost milliseconds.
+    with STAGE_SECONDS.time(stage="bgm_local_search"):
+        sounds = catalog.search(theme, limit=BGM_SUGGESTION_COUNT, semantic=embedder_ready())
+    source = "local"
+    if len(sounds) < BGM_MIN_LOCAL_RESULTS:
+        future = freesound_pool.submit(search_freesound, theme)
+        future.add_done_callback(store_freesound_results)
+        try:
+            found = future.result(timeout=BGM_FREESOUND_TIMEOUT_SECONDS)
+            local_ids = {sound["id"] for sound in sounds}
+            sounds = (sounds + [sound for sound in found
+                                if sound["preview_url"] and sound["id"] not in local_ids])[:BGM_SUGGESTION_COUNT]
+            source = "freesound"
+        except FutureTimeout:
+            log.warning("Freesound search for '%s' took over %ss, serving %d local results",
+                        theme, BGM_FREESOUND_TIMEOUT_SECONDS, len(sounds))
+            source = "freesound_timeout"
+        except Exception as e:
+            log.error("Freesound search for '%s' failed, serving %d local results: %s", theme, len(sounds), e)
+            source = "freesound_error"
+    BGM_LOOKUPS.inc(source=source)
+
+    # "cached_link" serves the preview from the backend's audio cache; the
+    # downloads start now so it is usually ready before the client asks.
+    audio_cache = get_audio_cache()
+    links = [sound["preview_url"] for sound in sounds]
+    keys = audio_cache.register(links)
+    if prefetch:
+        audio_cache.prefetch(links)
 
-    sound_list = [{"name" : sound.name, "link" : sound.previews.preview_hq_mp3} for sound in results]
+    sound_list = [{"name" : sound["name"], "link" : sound["preview_url"],
+                   "cached_link" : f"/api/bgm/preview/{keys[sound['preview_url']]}"} for sound in sounds]
     return sound_list
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import CACHE_LOOKUPS
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+class SqliteCache:
+    """Small persistent key/value store with per-entry TTL and LRU eviction.
+
+    Values are stored as JSON. Expired entries are treated as misses unless
+    `allow_expired=True` is passed to `get`, which lets callers fall back to
+    stale data when the upstream source is unavailable. Once the table grows
+    past `max_entries`, the least recently read entries are evicted. Safe to
+    share between threads and between processes pointing at the same file.
+    Lookups count towards the cache hit-rate metric unless `record_lookups`
+    is False, for stores that are not caches.
+    """
+
+    def __init__(self, name, max_entries=10000, record_lookups=True):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.max_entries = max_entries
+        self.record_lookups = record_lookups
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key, default=None, allow_expired=False):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] <= now and not allow_expired):
+                self.misses += 1
+                if self.record_lookups:
+                    CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return default
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        if self.record_lookups:
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def incr(self, key, amount, ttl):
+        """Add `amount` to a numeric entry (missing or expired counts as 0) and return the new value.
+
+        One SQL statement, so increments from other threads and processes
+        are never lost.
+        """
+        now = time.time()
+        with self._lock:
+            value = self._conn.execute(
+                "INSERT INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET"
+                "  value = CASE WHEN expires_at > excluded.accessed_at THEN value + ? ELSE ? END,"
+                "  expires_at = excluded.expires_at, accessed_at = excluded.accessed_at"
+                " RETURNING value",
+                (key, json.dumps(amount), now + ttl, now, amount, amount)
+            ).fetchone()[0]
+            self._evict()
+            self._conn.commit()
+        return json.loads(value) if isinstance(value, str) else value
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+class LRUCache:
+    """Thread-safe in-process LRU map with the same hit/miss counters as SqliteCache."""
+
+    def __init__(self, max_entries=256, name="memory"):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,164 @@
+"""Shared embedding model with dynamic micro-batching.
+
+Every caller goes through `get_embedder().encode(texts)`. Requests that
+arrive close together, from any thread, are merged into one
+SentenceTransformer batch bounded by EMBEDDING_MAX_BATCH_SIZE texts and
+EMBEDDING_MAX_WAIT_MS of waiting.
+
+With several uvicorn workers, run this module as its own single-process
+service so only one copy of the model is loaded and batching spans every
+worker:
+
+    uvicorn embedding_service:app --port 8001 --workers 1
+
+and point the backend at it with EMBEDDING_SERVICE_URL=http://localhost:8001.
+Without that variable each process batches its own requests locally.
+"""
+import os
+import time
+import queue
+import base64
+import threading
+from concurrent.futures import Future
+import numpy as np
+import requests
+from fastapi import FastAPI
+from pydantic import BaseModel
+from typing import List
+from dotenv import load_dotenv
+from utils import lazy_singleton
+from metrics import STAGE_SECONDS, histogram
+
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384  # output size of EMBEDDING_MODEL_NAME
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL")
+EMBEDDING_SERVICE_TIMEOUT_SECONDS = 60
+
+EMBEDDING_BATCH_SIZE = histogram("cohost_embedding_batch_texts", "Texts per embedding model call.",
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+@lazy_singleton
+def get_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def encode_normalized(texts, batch_size=EMBEDDING_MAX_BATCH_SIZE):
+    return get_embedding_model().encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                                        convert_to_numpy=True).astype(np.float32, copy=False)
+
+class MicroBatcher:
+    """Collects encode requests from many threads into batched model calls.
+
+    A background thread takes the first waiting request, then keeps adding
+    requests until `max_batch_size` texts are gathered or `max_wait_ms` has
+    passed, runs one `encode_fn` call and hands each caller its own rows.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=EMBEDDING_MAX_BATCH_SIZE, max_wait_ms=EMBEDDING_MAX_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.texts = 0
+        self._requests = queue.Queue()
+        threading.Thread(target=self._loop, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            with STAGE_SECONDS.time(stage="embedding_batch"):
+                embeddings = self.encode_fn(texts)
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self):
+        return {"batches": self.batches, "texts": self.texts, "queued": self._requests.qsize()}
+
+def pack_embeddings(embeddings):
+    return {"shape": list(embeddings.shape), "data": base64.b64encode(embeddings.tobytes()).decode("ascii")}
+
+def unpack_embeddings(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+class RemoteEmbedder:
+    """Client for a standalone embedding service; same interface as MicroBatcher."""
+
+    def __init__(self, url, timeout=EMBEDDING_SERVICE_TIMEOUT_SECONDS):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        response = self.session.post(f"{self.url}/embed", json={"texts": list(texts)}, timeout=self.timeout)
+        response.raise_for_status()
+        return unpack_embeddings(response.json())
+
+@lazy_singleton
+def get_local_batcher():
+    return MicroBatcher(encode_normalized)
+
+@lazy_singleton
+def get_embedder():
+    if EMBEDDING_SERVICE_URL:
+        return RemoteEmbedder(EMBEDDING_SERVICE_URL)
+    return get_local_batcher()
+
+def embedder_ready():
+    """True when encode() won't have to load the model first (it is loaded, or lives in the service)."""
+    return bool(EMBEDDING_SERVICE_URL) or get_embedding_model.is_initialized()
+
+# Standalone service, see the module docstring.
+app = FastAPI()
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    # Sync endpoint: FastAPI runs it on its threadpool, so concurrent requests
+    # block in encode() together and get merged into shared batches.
+    return pack_embeddings(get_local_batcher().encode(request.texts))
+
+@app.get("/health")
+def health():
+    return {"model": EMBEDDING_MODEL_NAME, "loaded": get_embedding_model.is_initialized(),
+            **get_local_batcher().stats()}
@@ -0,0 +1,178 @@
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from cache_utils import LRUCache
+
+log = logging.getLogger(__name__)
+
+SEARCH_JOB_WORKERS = 2
+# Finished jobs are kept this long so clients can collect the result, and
+# a new submission for the same keyword reuses them instead of starting over.
+SEARCH_JOB_TTL_SECONDS = 15 * 60
+SEARCH_RESULT_TTL_SECONDS = 5 * 60
+SEARCH_RESULT_MAX_ENTRIES = 256
+
+def normalize_keyword(keyword):
+    return " ".join(keyword.lower().split())
+
+class SearchJob:
+    def __init__(self, keyword, top_n, prune_depth):
+        self.id = uuid.uuid4().hex
+        self.keyword = keyword
+        self.top_n = top_n
+        self.prune_depth = prune_depth
+        self.status = "queued"
+        self.stages = {}
+        self.partial_results = []
+        self.meta = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def report(self, event, data):
+        with self._lock:
+            if event == "stage":
+                self.stages[data["stage"]] = {"done": data["done"], "total": data["total"]}
+            elif event == "video":
+                self.partial_results.append(data)
+            elif event == "meta":
+                self.meta.update(data)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "keyword": self.keyword,
+                "top_n": self.top_n,
+                "prune_depth": self.prune_depth,
+                "status": self.status,
+                "stages": {stage: dict(progress) for stage, progress in self.stages.items()},
+                "partial_results": list(self.partial_results),
+                "meta": dict(self.meta),
+                "result": self.result,
+                "error": self.error
+            }
+
+class SearchJobManager:
+    """Runs searches on a small worker pool and keeps their progress for polling.
+
+    `run(keyword, top_n, prune_depth, report)` does the actual work.
+    Submitting a keyword that is already queued, running or recently
+    finished (same normalized keyword, top_n and prune_depth) returns the
+    existing job instead of a new one.
+    """
+
+    def __init__(self, run, max_workers=SEARCH_JOB_WORKERS, ttl=SEARCH_JOB_TTL_SECONDS):
+        self.run = run
+        self.ttl = ttl
+        self.jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-job")
+
+    def submit(self, keyword, top_n, prune_depth):
+        key = (normalize_keyword(keyword), top_n, prune_depth)
+        with self._lock:
+            self._expire()
+            job = self._by_key.get(key)
+            if job is not None and job.status != "failed":
+                return job
+            job = SearchJob(keyword, top_n, prune_depth)
+            self.jobs[job.id] = job
+            self._by_key[key] = job
+        self._pool.submit(self._execute, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _execute(self, job):
+        job.status = "running"
+        try:
+            result = self.run(job.keyword, job.top_n, job.prune_depth, job.report)
+            with job._lock:
+                job.result = result
+                job.status = "done"
+        except Exception as e:
+            log.error("Search job %s for '%s' failed: %s", job.id, job.keyword, e)
+            with job._lock:
+                job.error = str(e)
+                job.status = "failed"
+        job.finished_at = time.time()
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl:
+                del self.jobs[job_id]
+                key = (normalize_keyword(job.keyword), job.top_n, job.prune_depth)
+                if self._by_key.get(key) is job:
+                    del self._by_key[key]
+
+class SingleFlight:
+    """Coalesces concurrent identical calls and briefly caches their result.
+
+    `await ado(key, fn)` runs `fn()` once per key at a time: callers arriving
+    while it is running wait for the same result instead of starting their own.
+    A successful result is served from memory for `ttl` seconds; failures
+    are passed to every waiting caller but not cached.
+    """
+
+    def __init__(self, ttl=SEARCH_RESULT_TTL_SECONDS, max_entries=SEARCH_RESULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.results = LRUCache(max_entries, name="search_results")
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        cached = self.results.get(key)
+        if cached is not None and cached[0] > time.time():
+            return True, cached[1]
+        return False, None
+
+    def _claim(self, key):
+        # Returns the in-flight future for key and whether this caller must run it.
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _run(self, key, future, fn):
+        try:
+            result = fn()
+            self.results.set(key, (time.time() + self.ttl, result))
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def ado(self, key, fn, executor=None):
+        """Only the caller that runs `fn` takes a thread from `executor`; the
+        others await its result on the event loop."""
+        hit, result = self._cached(key)
+        if hit:
+            return result
+        future, leader = self._claim(key)
+        if leader:
+            return await asyncio.get_running_loop().run_in_executor(executor, self._run, key, future, fn)
+        # Shielded so a waiter that goes away can't cancel the shared future.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {"in_flight": in_flight, "coalesced": self.coalesced, **self.results.stats()}
@@ -0,0 +1,293 @@
+"""Shared client for one or more OpenAI-compatible LLM servers (LM Studio, llama.cpp, vLLM).
+
+Backends come from LLM_API_URLS, a comma-separated list of base URLs
+(e.g. "http://10.0.0.5:1234,http://10.0.0.6:1234"). Each request goes to
+the healthy backend with the fewest requests in flight, over a keep-alive
+connection pool, with connect/read timeouts. Connection errors, timeouts,
+429 and 5xx responses are retried with exponential backoff on the next
+best backend. A background task probes GET /v1/models so dead backends
+are skipped and recovered ones come back.
+
+All HTTP runs on one event loop in a background thread, with an
+httpx.AsyncClient per backend. Coroutines (`achat`, `astream_chat`) await
+it without blocking their own loop; threads (`chat`) block only
+themselves. Both kinds share the same connections and slot limit.
+
+Besides httpx and python-dotenv this module only needs the backend's
+`metrics` and `utils` when they are importable; loaded on its own (the
+CoHostVideo scripts do this) it runs without metrics.
+"""
+import os
+import time
+import json
+import random
+import asyncio
+import logging
+import threading
+import httpx
+from dotenv import load_dotenv
+try:
+    from utils import lazy_singleton
+    from metrics import counter, histogram, TOKEN_BUCKETS
+except ImportError:
+    import functools
+
+    class _NoMetric:
+        def observe(self, *args, **labels):
+            pass
+
+        def inc(self, *args, **labels):
+            pass
+
+    def counter(*args, **kwargs):
+        return _NoMetric()
+
+    histogram = counter
+    TOKEN_BUCKETS = ()
+    lazy_singleton = functools.lru_cache(maxsize=None)
+
+load_dotenv()
+log = logging.getLogger(__name__)
+
+LLM_API_URLS = os.getenv("LLM_API_URLS", "http://localhost:1234")
+# Parallel slots per backend (LM Studio "max concurrent predictions", llama.cpp --parallel).
+LLM_PARALLEL_SLOTS = int(os.getenv("LLM_PARALLEL_SLOTS", "4"))
+LLM_CONNECT_TIMEOUT_SECONDS = 5
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "180"))
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF_SECONDS = 0.5
+LLM_HEALTH_INTERVAL_SECONDS = 15
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+COMPLETIONS_PATH = "/v1/chat/completions"
+
+LLM_REQUEST_SECONDS = histogram("cohost_llm_request_seconds", "LLM request latency, from sending to the last token.",
+                                ["backend", "mode"])
+LLM_FIRST_TOKEN_SECONDS = histogram("cohost_llm_first_token_seconds", "Time to the first streamed token.", ["backend"])
+LLM_QUEUE_SECONDS = histogram("cohost_llm_queue_seconds", "Time spent waiting for a free LLM slot.")
+LLM_TOKENS = histogram("cohost_llm_tokens", "Tokens per LLM request.", ["kind"], buckets=TOKEN_BUCKETS)
+LLM_FAILURES = counter("cohost_llm_failures_total", "Failed LLM attempts, including retried ones.", ["backend", "reason"])
+
+class LLMUnavailable(Exception):
+    pass
+
+class LLMBackend:
+    def __init__(self, url, slots, timeout):
+        self.url = url.rstrip("/")
+        if self.url.endswith(COMPLETIONS_PATH):
+            self.url = self.url[:-len(COMPLETIONS_PATH)]
+        self.client = httpx.AsyncClient(
+            base_url=self.url, timeout=timeout,
+            limits=httpx.Limits(max_connections=slots * 2, max_keepalive_connections=slots)
+        )
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+    def stats(self):
+        return {"url": self.url, "healthy": self.healthy, "outstanding": self.outstanding,
+                "requests": self.requests, "failures": self.failures}
+
+class LLMPool:
+    def __init__(self, urls, slots=LLM_PARALLEL_SLOTS,
+                 timeout=(LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS),
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF_SECONDS,
+                 health_interval=LLM_HEALTH_INTERVAL_SECONDS):
+        if isinstance(urls, str):
+            urls = [url.strip() for url in urls.split(",") if url.strip()]
+        connect_timeout, read_timeout = timeout
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.backends = [LLMBackend(url, slots, timeout) for url in urls]
+        # Total requests in flight across all backends; extra callers wait here
+        # rather than queueing inside an LLM server.
+        self.capacity = slots * len(self.backends)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True).start()
+        if health_interval:
+            asyncio.run_coroutine_threadsafe(self._probe_loop(health_interval), self._loop)
+
+    # The coroutines below run on self._loop only, so backend bookkeeping
+    # needs no locks.
+
+    def _acquire_backend(self, exclude):
+        candidates = [b for b in self.backends if b.healthy and b not in exclude] \
+            or [b for b in self.backends if b not in exclude] or self.backends
+        fewest = min(b.outstanding for b in candidates)
+        backend = random.choice([b for b in candidates if b.outstanding == fewest])
+        backend.outstanding += 1
+        backend.requests += 1
+        return backend
+
+    def _release_backend(self, backend, failed=False):
+        backend.outstanding -= 1
+        if failed:
+            backend.failures += 1
+
+    async def _wait_for_slot(self):
+        start = time.perf_counter()
+        await self._slots.acquire()
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - start)
+
+    async def _post(self, payload, stream):
+        """POST to the best backend, retrying elsewhere on transient failures.
+
+        Returns (backend, response); the caller must release the backend and,
+        when streaming, close the response.
+        """
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            backend = self._acquire_backend(tried)
+            try:
+                request = backend.client.build_request("POST", COMPLETIONS_PATH, json=payload)
+                response = await backend.client.send(request, stream=stream)
+                if response.status_code not in RETRYABLE_STATUS:
+                    if response.is_error:
+                        await response.aclose()
+                        response.raise_for_status()
+                    return backend, response
+                error = f"HTTP {response.status_code}"
+                reason = str(response.status_code)
+                await response.aclose()
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+                reason = "timeout" if isinstance(e, httpx.TimeoutException) else "connection"
+                backend.healthy = False
+            except asyncio.CancelledError:
+                self._release_backend(backend)
+                raise
+            except Exception as e:
+                reason = str(e.response.status_code) if isinstance(e, httpx.HTTPStatusError) else "error"
+                LLM_FAILURES.inc(backend=backend.url, reason=reason)
+                self._release_backend(backend, failed=True)
+                raise
+            LLM_FAILURES.inc(backend=backend.url, reason=reason)
+            self._release_backend(backend, failed=True)
+            tried.add(backend)
+            if len(tried) == len(self.backends):
+                tried.clear()
+            log.warning("LLM request to %s failed (%s), attempt %d/%d",
+                        backend.url, error, attempt + 1, self.max_retries + 1)
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        raise LLMUnavailable(f"All LLM attempts failed, last error: {error}")
+
+    async def _chat(self, payload):
+        await self._wait_for_slot()
+        try:
+            start = time.perf_counter()
+            backend, response = await self._post(payload, stream=False)
+            try:
+                result = response.json()
+            finally:
+                self._release_backend(backend)
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, backend=backend.url, mode="chat")
+            usage = result.get("usage") or {}
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if kind in usage:
+                    LLM_TOKENS.observe(usage[kind], kind=kind[:-len("_tokens")])
+            return result
+        finally:
+            self._slots.release()
+
+    async def _stream(self, payload):
+        await self._wait_for_slot()
+        try:
+            start = time.perf_counter()
+            backend, response = await self._post(dict(payload, stream=True), stream=True)
+            # Servers that don't report usage in the stream send about one token per delta.
+            deltas = 0
+            usage = None
+            try:
+                async for line in response.aiter_lines():
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    usage = event.get("usage") or usage
+                    if not event.get("choices"):
+                        continue
+                    delta = event["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        if deltas == 0:
+                            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, backend=backend.url)
+                        deltas += 1
+                        yield delta
+            finally:
+                await response.aclose()
+                self._release_backend(backend)
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, backend=backend.url, mode="stream")
+            if usage:
+                LLM_TOKENS.observe(usage.get("prompt_tokens", 0), kind="prompt")
+            LLM_TOKENS.observe(usage.get("completion_tokens", deltas) if usage else deltas, kind="completion")
+        finally:
+            self._slots.release()
+
+    async def _pump(self, payload, push):
+        # Forwards a stream to a consumer on another event loop.
+        try:
+            async for delta in self._stream(payload):
+                push(("delta", delta))
+            push(("end", None))
+        except Exception as e:
+            push(("error", e))
+
+    async def _check_health(self):
+        for backend in self.backends:
+            try:
+                response = await backend.client.get("/v1/models", timeout=LLM_CONNECT_TIMEOUT_SECONDS)
+                healthy = response.is_success
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                log.info("LLM backend %s is now %s", backend.url, "healthy" if healthy else "unhealthy")
+            backend.healthy = healthy
+
+    async def _probe_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self._check_health()
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def chat(self, payload):
+        """Send a chat completion request and return the decoded JSON response (blocking)."""
+        return self._submit(self._chat(payload)).result()
+
+    async def achat(self, payload):
+        """Awaitable chat(); cancelling the caller cancels the request."""
+        return await asyncio.wrap_future(self._submit(self._chat(payload)))
+
+    async def astream_chat(self, payload):
+        """Send a streaming chat completion request and yield content deltas as they arrive.
+
+        Retries only happen before the first byte; a stream that breaks
+        midway raises to the caller. Closing the generator early cancels
+        the request.
+        """
+        loop = asyncio.get_running_loop()
+        deltas = asyncio.Queue()
+        future = self._submit(self._pump(payload, lambda item: loop.call_soon_threadsafe(deltas.put_nowait, item)))
+        try:
+            while True:
+                kind, value = await deltas.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def stats(self):
+        return {"capacity": self.capacity, "backends": [b.stats() for b in self.backends]}
+
+@lazy_singleton
+def get_llm_pool():
+    return LLMPool(LLM_API_URLS)
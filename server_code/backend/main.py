@@ -1,12 +1,93 @@
-from fastapi import FastAPI
+import os
+import json
+import time
+import asyncio
+import functools
+import logging
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from youtube_utils import get_top_channels_for_topic
-from video_utils import generate_dialogue_script
-from bgm_suggestions import get_bgm_suggestions
+from pydantic import BaseModel, Field
+from youtube_utils import get_top_channels_for_topic, get_youtube_api, embed_texts, rank_known_videos, SEARCH_PRUNE_DEPTH, \
+    ProvisionalRanking, get_top_channels_for_topics
+from embedding_service import get_embedder
+from youtube_api import QuotaExhausted
+from video_utils import agenerate_dialogue_script, agenerate_dialogue_scripts, astream_dialogue_scripts, SCRIPT_FAILED
+from bgm_suggestions import get_bgm_suggestions, get_freesound_client
+from bgm_catalog import get_bgm_catalog
+from bgm_cache import get_audio_cache
+from jobs import SearchJobManager, SingleFlight, normalize_keyword
+from llm_client import get_llm_pool
+from token_utils import get_tokenizer
+import metrics
 from typing import List
 
-app = FastAPI()
+# LOG_LEVEL=DEBUG shows per-video pipeline decisions; records below the
+# level are dropped before their message is formatted.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# httpx logs every request at INFO, which would be one line per LLM call.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+log = logging.getLogger("main")
+
+HTTP_REQUEST_SECONDS = metrics.histogram("cohost_http_request_seconds", "HTTP request latency by route.",
+                                         ["method", "route", "status"])
+YOUTUBE_QUOTA_USED = metrics.gauge("cohost_youtube_quota_used", "YouTube Data API units used today.")
+LLM_BACKEND_HEALTHY = metrics.gauge("cohost_llm_backend_healthy", "1 if the LLM backend passed its last probe.",
+                                    ["backend"])
+LLM_BACKEND_OUTSTANDING = metrics.gauge("cohost_llm_backend_outstanding", "LLM requests in flight per backend.",
+                                        ["backend"])
+
+# Heavy clients are created lazily on first use. Set WARMUP_ON_STARTUP=1 to
+# build them in the background as soon as the worker starts instead.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+# Blocking work (googleapiclient, transcript downloads, SQLite, embedding
+# waits) never runs on the event loop. Whole search pipelines get their own
+# pool so a burst of searches cannot starve the short blocking calls, which
+# use the second one. LLM calls are awaited directly.
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+SEARCH_BATCH_MAX_KEYWORDS = 50
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+def warmup():
+    timings = {}
+    for name, init in (
+        ("youtube", get_youtube_api),
+        ("embedding_model", lambda: embed_texts(["warmup"])),
+        ("freesound", get_freesound_client),
+        ("bgm_catalog", get_bgm_catalog),
+        ("tokenizer", get_tokenizer),
+    ):
+        start = time.perf_counter()
+        try:
+            init()
+            timings[name] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            log.error("Warmup of %s failed: %s", name, e)
+            timings[name] = None
+    log.info("Warmup finished: %s", timings)
+    return timings
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warmup, daemon=True).start()
+    else:
+        # Local files only and small, so always loaded up front rather than
+        # by the first /api/generate-content request.
+        threading.Thread(target=get_tokenizer, name="tokenizer-load", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 # Enable CORS so frontend can access this API
 def format_json():
     pass 
@@ -17,41 +98,238 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    # Labelled by route template, not raw path, so ids don't explode the series.
+    # Streaming responses are timed until their headers are sent.
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=status)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    if get_youtube_api.is_initialized():
+        YOUTUBE_QUOTA_USED.set(get_youtube_api().quota_used())
+    if get_llm_pool.is_initialized():
+        for backend in get_llm_pool().stats()["backends"]:
+            LLM_BACKEND_HEALTHY.set(int(backend["healthy"]), backend=backend["url"])
+            LLM_BACKEND_OUTSTANDING.set(backend["outstanding"], backend=backend["url"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 class VideoInput(BaseModel):
     video_id: str
     transcript: str
 
 class VideoBatchRequest(BaseModel):
     videos: List[VideoInput]
+    use_cache: bool = True
 
 class SearchRequest(BaseModel):
     keyword: str
+    # How many candidates survive the metadata-only ranking and get transcripts.
+    prune_depth: int = Field(SEARCH_PRUNE_DEPTH, ge=1, le=50)
+    # Return {"channels": [...], "meta": {...}} instead of the bare channel list.
+    include_meta: bool = False
+
+class BGMRequest(BaseModel):
+    keyword: str
+
+class BatchSearchRequest(BaseModel):
+    keywords: List[str] = Field(min_length=1, max_length=SEARCH_BATCH_MAX_KEYWORDS)
+    prune_depth: int = Field(SEARCH_PRUNE_DEPTH, ge=1, le=50)
+
+# Identical searches that arrive together (same normalized keyword, top_n
+# and prune depth) share one pipeline run; its result is reused for a few minutes.
+search_flight = SingleFlight()
+
+def search_with_meta(keyword, top_n, prune_depth):
+    meta = {}
+    def report(event, data):
+        if event == "meta":
+            meta.update(data)
+    channels = get_top_channels_for_topic(keyword, top_n=top_n, prune_depth=prune_depth, report=report)
+    return {"channels": channels, "meta": meta}
 
 @app.post('/api/search')
 async def search_videos(request: SearchRequest):
     # topic=request.keyword
     # print("searching for {topic}")
-    top_results=get_top_channels_for_topic(request.keyword,top_n=3)
-    return top_results
+    top_n=3
+    try:
+        top_results=await search_flight.ado(
+            (normalize_keyword(request.keyword), top_n, request.prune_depth),
+            lambda: search_with_meta(request.keyword, top_n, request.prune_depth),
+            executor=search_executor
+        )
+    except QuotaExhausted as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return top_results if request.include_meta else top_results["channels"]
+
+@app.post('/api/search/stream')
+async def search_stream(request: SearchRequest):
+    # Same pipeline as /api/search, sent as newline-delimited JSON objects
+    # {"event", "data"} while it runs: stage progress, meta, the metadata
+    # shortlist ("candidates"), each accepted video, a provisional "ranking"
+    # whenever it changes, and finally "done" with the full result (or
+    # "error"). The pipeline finishes even if the client goes away.
+    top_n = 3
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def report(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def run():
+        try:
+            report("done", get_top_channels_for_topic(request.keyword, top_n=top_n,
+                                                      prune_depth=request.prune_depth, report=report))
+        except QuotaExhausted as e:
+            report("error", {"status": 429, "detail": str(e)})
+        except Exception as e:
+            log.exception("Streaming search for '%s' failed", request.keyword)
+            report("error", {"status": 500, "detail": str(e)})
+
+    async def lines():
+        ranking = ProvisionalRanking(top_n)
+        loop.run_in_executor(search_executor, run)
+        while True:
+            event, data = await events.get()
+            yield json.dumps({"event": event, "data": data}) + "\n"
+            ranked = ranking.update(event, data)
+            if ranked:
+                yield json.dumps({"event": "ranking", "data": ranked}) + "\n"
+            if event in ("done", "error"):
+                return
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post('/api/search/batch')
+async def search_batch(request: BatchSearchRequest):
+    # Many related keywords in one pipeline run: videos they have in common
+    # are detailed, transcribed, embedded and scripted once. Keywords that
+    # normalize to the same text are searched once, under their first
+    # spelling ("searched_as"), and every requested keyword gets a result
+    # in request order.
+    searched_as = {}
+    for keyword in request.keywords:
+        searched_as.setdefault(normalize_keyword(keyword), keyword)
+    try:
+        batch = await run_blocking(search_executor, get_top_channels_for_topics, list(searched_as.values()),
+                                   top_n=3, prune_depth=request.prune_depth)
+    except QuotaExhausted as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    channels = {result["keyword"]: result["channels"] for result in batch["results"]}
+    results = []
+    for keyword in request.keywords:
+        searched = searched_as[normalize_keyword(keyword)]
+        results.append({"keyword": keyword, "searched_as": searched, "channels": channels[searched]})
+    return {"results": results, "meta": {**batch["meta"], "keywords": len(request.keywords)}}
+
+@app.post('/api/search/local')
+async def search_local(request: SearchRequest):
+    # Ranks only videos earlier searches have already scored; answers in
+    # milliseconds and spends no YouTube quota, but finds nothing new.
+    return await run_blocking(blocking_executor, rank_known_videos, request.keyword, top_n=3)
+
+search_jobs = SearchJobManager(
+    lambda keyword, top_n, prune_depth, report: get_top_channels_for_topic(
+        keyword, top_n=top_n, prune_depth=prune_depth, report=report)
+)
+
+@app.post("/api/search/jobs", status_code=202)
+def submit_search_job(request: SearchRequest):
+    # Same search as /api/search, run in the background. Poll the returned
+    # job id for per-stage progress, partial results and the final ranking.
+    job = search_jobs.submit(request.keyword, top_n=3, prune_depth=request.prune_depth)
+    return job.to_dict()
+
+@app.get("/api/search/jobs/{job_id}")
+def get_search_job(job_id: str):
+    job = search_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired search job")
+    return job.to_dict()
+
+@app.get("/api/search/stats")
+def search_stats():
+    return search_flight.stats()
+
+@app.get("/api/youtube/quota")
+def youtube_quota():
+    return get_youtube_api().quota_status()
+
+@app.post("/api/warmup")
+def warmup_clients():
+    # Seconds spent initializing each client; ~0 once they are warm.
+    return {"seconds": warmup()}
+
+@app.get("/api/warmup")
+def warmup_status():
+    return {
+        "youtube": get_youtube_api.is_initialized(),
+        "embedding_model": get_embedder.is_initialized(),
+        "freesound": get_freesound_client.is_initialized(),
+        "bgm_catalog": get_bgm_catalog.is_initialized(),
+        "tokenizer": get_tokenizer.is_initialized()
+    }
 
 @app.post("/api/generate-content")
 async def generate_content(request: VideoBatchRequest):
-    individual_summaries=[]
-    for v in request.videos:
-        summary=generate_dialogue_script(v.transcript)
-        individual_summaries.append({
-            "video_id":v.video_id,
-            "summary":summary
-        })
-    combined_text=" ".join([s['summary'] for s in individual_summaries])
-    combined_transcript=generate_dialogue_script(combined_text)
+    summaries=await agenerate_dialogue_scripts([v.transcript for v in request.videos], use_cache=request.use_cache)
+    individual_summaries=[
+        {"video_id":v.video_id, "summary":summary}
+        for v, summary in zip(request.videos, summaries)
+    ]
+    combined_text=" ".join([s['summary'] for s in individual_summaries if s['summary']!=SCRIPT_FAILED])
+    combined_transcript=await agenerate_dialogue_script(combined_text, use_cache=request.use_cache)
     return {
         "summaries":individual_summaries,
         "combined_transcript":combined_transcript
     }
 
+@app.post("/api/generate-content/stream")
+async def generate_content_stream(request: VideoBatchRequest):
+    # Same work as /api/generate-content, sent as server-sent events while
+    # each dialogue exchange is parsed. The last event ("done") carries the
+    # full response. Runs on the event loop, so an open stream holds no
+    # thread, and a client that disconnects cancels its generations.
+    async def events():
+        videos=[(v.video_id, v.transcript) for v in request.videos]
+        async for event, data in astream_dialogue_scripts(videos, use_cache=request.use_cache):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/bgm_suggestions")
-def bgm_suggestions(request: SearchRequest):
-    response = get_bgm_suggestions(request.keyword)
+async def bgm_suggestions(request: BGMRequest):
+    response = await run_blocking(blocking_executor, get_bgm_suggestions, request.keyword)
     return response
 
+@app.get("/api/bgm/preview/{key}")
+def bgm_preview(key: str):
+    # Cached preview audio by the key from a suggestion's "cached_link".
+    # FileResponse answers Range requests, so players can seek and resume.
+    audio_cache = get_audio_cache()
+    path = audio_cache.lookup(key)
+    if path is None:
+        url = audio_cache.url_for_key(key)
+        if url is None:
+            raise HTTPException(status_code=404, detail="Unknown preview")
+        try:
+            path = audio_cache.fetch(url)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Could not download preview: {e}")
+    return FileResponse(path, media_type="audio/mpeg", headers={"Cache-Control": "public, max-age=86400"})
+
+@app.get("/api/bgm/cache")
+def bgm_cache_stats():
+    return get_audio_cache().stats()
+
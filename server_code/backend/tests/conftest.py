@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Tests import the backend modules the way uvicorn does, from server_code/backend,
+# and keep their SQLite caches out of the real CACHE_DIR.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="cohost-tests-"))
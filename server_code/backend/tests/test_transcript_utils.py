@@ -0,0 +1,30 @@
+from transcript_utils import compact_captions
+
+def test_rolling_captions_overlapping_by_one_word_are_merged():
+    segments = ["to the show today we", "um we talk about", "about cats", "cats", "cats are great"]
+    assert compact_captions(segments) == "to the show today we talk about cats are great"
+
+def test_rolling_captions_overlapping_by_several_words_are_merged():
+    segments = ["so the first thing", "the first thing you need", "you need is a plan"]
+    assert compact_captions(segments) == "so the first thing you need is a plan"
+
+def test_exact_repeats_are_dropped():
+    assert compact_captions(["we are here", "we are here", "are here now"]) == "we are here now"
+
+def test_lone_one_word_segment_is_kept():
+    assert compact_captions(["hello"]) == "hello"
+    assert compact_captions(["and that was it", "Bye."]) == "and that was it Bye."
+
+def test_sound_tags_are_removed():
+    assert compact_captions(["[Music]", "♪ welcome back", "(applause) thanks"]) == "welcome back thanks"
+
+def test_fillers_are_removed_whole():
+    assert compact_captions(["mm-hmm right", "uh-huh so um, yes"]) == "right so yes"
+    assert compact_captions(["Hmm. well erm okay"]) == "well okay"
+
+def test_hyphenated_words_starting_like_fillers_are_kept():
+    assert compact_captions(["uh-oh that broke"]) == "uh-oh that broke"
+
+def test_long_transcripts_are_not_truncated():
+    segments = [f"sentence number {i} ends here" for i in range(5000)]
+    assert compact_captions(segments).split()[-4:] == ["number", "4999", "ends", "here"]
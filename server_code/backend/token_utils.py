@@ -0,0 +1,69 @@
+"""Token counting and token-budgeted trimming with the LLM's own tokenizer.
+
+The tokenizer named by LLM_TOKENIZER (a local path, or a Hugging Face repo
+id already in the local HF cache) is loaded at startup or on first use.
+Nothing is downloaded unless LLM_TOKENIZER_DOWNLOAD=1. When transformers
+is missing or the tokenizer cannot be loaded, counts fall back to
+TOKENS_PER_WORD per word.
+
+Tokenizing a long transcript takes a while, so async code calls these
+functions through a worker thread.
+"""
+import os
+import logging
+from utils import lazy_singleton
+
+log = logging.getLogger(__name__)
+
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "Gryphe/MythoMax-L2-13b")
+LLM_TOKENIZER_DOWNLOAD = os.getenv("LLM_TOKENIZER_DOWNLOAD", "0") == "1"
+TOKENS_PER_WORD = 4 / 3
+
+@lazy_singleton
+def get_tokenizer():
+    """Return the LLM tokenizer, or None when it is unavailable."""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(LLM_TOKENIZER, local_files_only=not LLM_TOKENIZER_DOWNLOAD)
+    except Exception as e:
+        log.warning("Tokenizer %s unavailable, estimating tokens from word counts: %s", LLM_TOKENIZER, e)
+        return None
+
+def count_tokens(text: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return int(len(text.split()) * TOKENS_PER_WORD)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+def _word_cuts(text, max_tokens):
+    words = text.split()
+    step = max(1, int(max_tokens / TOKENS_PER_WORD))
+    return [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+
+def split_by_tokens(text: str, max_tokens: int):
+    """Split text into consecutive pieces of at most `max_tokens` tokens, cutting at whitespace."""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return _word_cuts(text, max_tokens)
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    pieces = []
+    start_token = 0
+    while start_token < len(offsets):
+        end_token = min(start_token + max_tokens, len(offsets))
+        start = offsets[start_token][0]
+        end = offsets[end_token - 1][1]
+        if end_token < len(offsets):
+            # Back off to the last space so no word is split across pieces.
+            space = text.rfind(' ', start, end)
+            if space > start:
+                end = space
+                while end_token > start_token + 1 and offsets[end_token - 1][0] >= end:
+                    end_token -= 1
+        pieces.append(text[start:end].strip())
+        start_token = end_token
+    return [piece for piece in pieces if piece]
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest whitespace-bounded prefix of text that fits in `max_tokens` tokens."""
+    pieces = split_by_tokens(text, max_tokens)
+    return pieces[0] if pieces else ""
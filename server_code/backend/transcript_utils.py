@@ -0,0 +1,170 @@
+import re
+import time
+import queue
+import logging
+import threading
+import requests
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from cache_utils import SqliteCache
+from metrics import counter, histogram
+from utils import lazy_singleton
+
+log = logging.getLogger(__name__)
+
+TRANSCRIPT_FETCH_CONCURRENCY = 8
+TRANSCRIPT_FETCH_TIMEOUT_SECONDS = 10.0
+# Per HTTP request made by youtube_transcript_api (connect, read). Without it
+# a fetch abandoned by fetch_transcripts could hang on a dead socket forever.
+TRANSCRIPT_HTTP_TIMEOUT = (5, TRANSCRIPT_FETCH_TIMEOUT_SECONDS)
+TRANSCRIPT_TTL_SECONDS = 7 * 24 * 3600
+TRANSCRIPT_MISSING_TTL_SECONDS = 6 * 3600  # captions may be added after upload
+TRANSCRIPT_STORE_MAX_ENTRIES = 20000
+
+# Bracketed captions ([Music], [Applause], [ __ ]), parenthesized sound cues and note glyphs.
+SOUND_TAG = re.compile(
+    r"\[[^\]]*\]|\((?:music|applause|laughter|laughs|cheering|inaudible|silence|noise)[^)]*\)|[\u266a\u266b\u266c]+",
+    re.IGNORECASE
+)
+# Whole filler words, hyphenated ones included ("mm-hmm", "uh-huh"), but
+# not the start of another hyphenated word ("uh-oh").
+FILLER = re.compile(
+    r"(?<![\w-])(?:u+m+|u+h+|e+r+m+|h+m+|m+h*m+)(?:-(?:u+m+|u+h+|h+u+h+|h+m+|m+h*m+))*(?![\w-])[,.]?",
+    re.IGNORECASE
+)
+PUNCTUATION = re.compile(r"[^\w']+")
+# Auto-captions repeat the tail of the previous line at the start of the next;
+# overlaps are looked for within this many words.
+MAX_CAPTION_OVERLAP_WORDS = 24
+
+# Stored under a new name: older entries hold raw or truncated captions.
+transcript_store = SqliteCache("transcripts_full", max_entries=TRANSCRIPT_STORE_MAX_ENTRIES)
+
+TRANSCRIPT_FETCHES = counter("cohost_transcript_fetches_total", "Transcript downloads by outcome.", ["outcome"])
+TRANSCRIPT_FETCH_SECONDS = histogram("cohost_transcript_fetch_seconds", "Time to download one transcript.")
+TRANSCRIPT_KEPT_RATIO = histogram("cohost_transcript_kept_ratio", "Words kept by compaction, as a share of caption words.",
+                                  buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+
+def compact_captions(segments):
+    """Join caption segment texts into a clean transcript.
+
+    Sound tags and filler words are removed, a segment that repeats the end
+    of the text so far (rolling auto-captions) only contributes its new
+    words, exact repeats are dropped and whitespace is collapsed. Nothing
+    is cut: consumers that need a budget (the prompt, the embedding) apply
+    their own.
+    """
+    words = []
+    keys = []
+    raw_words = 0
+    for segment in segments:
+        raw_words += len(segment.split())
+        segment = FILLER.sub(" ", SOUND_TAG.sub(" ", segment)).split()
+        if not segment:
+            continue
+        segment_keys = [PUNCTUATION.sub("", word.lower()) for word in segment]
+        overlap = 0
+        for size in range(min(MAX_CAPTION_OVERLAP_WORDS, len(segment), len(keys)), 0, -1):
+            # Fillers are already gone from both sides, so "today we" followed
+            # by "um we talk" overlaps on "we".
+            if keys[-size:] == segment_keys[:size]:
+                overlap = size
+                break
+        words.extend(segment[overlap:])
+        keys.extend(segment_keys[overlap:])
+
+    if raw_words:
+        TRANSCRIPT_KEPT_RATIO.observe(len(words) / raw_words)
+    return ' '.join(words)
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies `timeout` to every request that doesn't set one."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+@lazy_singleton
+def get_transcript_session():
+    return TimeoutSession(TRANSCRIPT_HTTP_TIMEOUT)
+
+def get_transcript_text(video_id):
+    cached = transcript_store.get(video_id)
+    if cached is not None:
+        return cached
+
+    try:
+        with TRANSCRIPT_FETCH_SECONDS.time():
+            transcript = YouTubeTranscriptApi(http_client=get_transcript_session()).fetch(video_id, languages=['en'])
+        text = compact_captions(snippet.text for snippet in transcript)
+        transcript_store.set(video_id, text, TRANSCRIPT_TTL_SECONDS)
+        TRANSCRIPT_FETCHES.inc(outcome="ok")
+        return text
+
+    except (TranscriptsDisabled, NoTranscriptFound):
+        transcript_store.set(video_id, "", TRANSCRIPT_MISSING_TTL_SECONDS)
+        TRANSCRIPT_FETCHES.inc(outcome="missing")
+        return ""
+    except Exception as e:
+        # Transient failures are not cached so the next search retries them.
+        log.error("Transcript error for %s: %s", video_id, e)
+        TRANSCRIPT_FETCHES.inc(outcome="error")
+        return ""
+
+def fetch_transcripts(video_ids, max_workers=TRANSCRIPT_FETCH_CONCURRENCY,
+                      timeout=TRANSCRIPT_FETCH_TIMEOUT_SECONDS, fetch=get_transcript_text, on_result=None):
+    """Fetch transcripts for many videos in parallel.
+
+    At most `max_workers` fetches are in flight at once. A fetch that runs
+    longer than `timeout` seconds is abandoned and counted as an empty
+    transcript, and its slot is handed to the next video straight away, so a
+    stuck video costs one timeout instead of stalling the queue. The
+    abandoned fetch still ends on its own, since every HTTP request it
+    makes is bounded by TRANSCRIPT_HTTP_TIMEOUT. Returns a
+    dict of video_id -> transcript text; `on_result(video_id, text)` is
+    called as each one settles.
+    """
+    pending = list(dict.fromkeys(video_ids))
+    results = {}
+    done = queue.Queue()
+    deadlines = {}
+
+    def worker(video_id):
+        try:
+            text = fetch(video_id)
+        except Exception as e:
+            log.error("Transcript worker failed for %s: %s", video_id, e)
+            text = ""
+        done.put((video_id, text))
+
+    pending.reverse()
+    while pending or deadlines:
+        while pending and len(deadlines) < max_workers:
+            video_id = pending.pop()
+            deadlines[video_id] = time.monotonic() + timeout
+            # Daemon threads: an abandoned fetch must not keep the process alive.
+            threading.Thread(target=worker, args=(video_id,), daemon=True).start()
+
+        wait = max(0.0, min(deadlines.values()) - time.monotonic())
+        try:
+            video_id, text = done.get(timeout=wait)
+            if video_id in deadlines:
+                del deadlines[video_id]
+                results[video_id] = text
+                if on_result:
+                    on_result(video_id, text)
+        except queue.Empty:
+            now = time.monotonic()
+            for video_id, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    log.warning("Transcript fetch for %s timed out after %.1fs", video_id, timeout)
+                    TRANSCRIPT_FETCHES.inc(outcome="timeout")
+                    del deadlines[video_id]
+                    results[video_id] = ""
+                    if on_result:
+                        on_result(video_id, "")
+
+    return results
@@ -1,20 +1,154 @@
 import re
 import json
+import logging
+import functools
+import threading
+
+# Characters that can change the parser state; everything else is skipped in bulk.
+STRUCTURAL_CHARS = re.compile(r'[{}"\\]')
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+DECODER = json.JSONDecoder(strict=False)
+log = logging.getLogger(__name__)
+SPEAKER_LINE = re.compile(r'"([A-Za-z][\w ]*)"\s*:\s*"((?:[^"\\]|\\.)*)"?', re.DOTALL)
+
+class DialogueParser:
+    """Incremental parser for the dialogue exchanges an LLM writes as JSON.
+
+    Feed it completion text in chunks of any size; `feed` returns every
+    `{"Human": ..., "Bot": ...}` exchange whose closing brace arrived in that
+    chunk. Text outside objects (prose, code fences, the surrounding array)
+    is ignored and braces inside strings are handled. Objects that arrive
+    whole are decoded directly; the rest are tracked with a small state
+    machine that looks at each character once, so parsing stays linear in
+    the length of the completion however it is chunked.
+
+    A malformed object is repaired where possible (trailing commas, raw
+    newlines in strings, a missing closing quote) and otherwise reduced to
+    the speaker lines that can still be read from it, so one bad exchange no
+    longer drops its neighbours. `close` salvages an object left unfinished
+    when the completion was cut off.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str):
+        exchanges = []
+        start = 0 if self._depth else None
+        pos = 0
+        if self._escaped and chunk:
+            # The previous chunk ended on a backslash inside a string.
+            self._escaped = False
+            pos = 1
+        while True:
+            match = STRUCTURAL_CHARS.search(chunk, pos)
+            if match is None:
+                break
+            ch = match.group()
+            i = match.start()
+            pos = i + 1
+            if self._in_string:
+                if ch == '\\':
+                    if pos < len(chunk):
+                        pos += 1
+                    else:
+                        self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self._depth > 0
+            elif ch == '{':
+                if self._depth == 0:
+                    # Fast path: a well-formed object that is already complete
+                    # in this chunk is decoded in one C call.
+                    try:
+                        value, pos = DECODER.raw_decode(chunk, i)
+                        exchanges.extend(self._exchanges(value))
+                        continue
+                    except ValueError:
+                        start = i
+                self._depth += 1
+            elif ch == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:pos])
+                    exchanges.extend(self._parse(''.join(self._parts)))
+                    self._parts = []
+                    start = None
+        if start is not None:
+            self._parts.append(chunk[start:])
+        return exchanges
+
+    def close(self):
+        """Flush an unterminated trailing object, returning whatever exchange it still holds."""
+        fragment = ''.join(self._parts)
+        self.__init__()
+        return self._salvage(fragment) if fragment else []
+
+    def _parse(self, text):
+        for candidate in (text, TRAILING_COMMA.sub(r'\1', text)):
+            try:
+                return self._exchanges(json.loads(candidate, strict=False))
+            except ValueError:
+                continue
+        return self._salvage(text)
+
+    def _exchanges(self, value):
+        # Some models wrap the exchanges, e.g. {"dialogue": [{...}, ...]}.
+        if isinstance(value, list):
+            return [exchange for item in value for exchange in self._exchanges(item)]
+        if not isinstance(value, dict):
+            return []
+        if value and all(isinstance(line, str) for line in value.values()):
+            return [value]
+        if value and all(line is None or isinstance(line, (str, int, float, bool)) for line in value.values()):
+            # e.g. {"Human": "...", "Bot": 5}: keep the exchange, as text.
+            log.warning("Coerced non-string line in exchange: %r", value)
+            return [{speaker: "" if line is None else str(line) for speaker, line in value.items()}]
+        return [exchange for item in value.values() for exchange in self._exchanges(item)]
+
+    def _salvage(self, text):
+        pairs = {}
+        for speaker, line in SPEAKER_LINE.findall(text):
+            try:
+                pairs[speaker] = json.loads(f'"{line}"', strict=False)
+            except ValueError:
+                pairs[speaker] = line
+        if pairs:
+            log.debug("Recovered malformed exchange: %r", text[:80])
+            return [pairs]
+        log.warning("Skipped malformed exchange: %r", text[:80])
+        return []
+
+def parse_dialogue(text: str):
+    parser = DialogueParser()
+    return parser.feed(text) + parser.close()
+
+def format_exchanges(exchanges) -> str:
+    return ''.join(f"{speaker}: {line}\n\n" for pair in exchanges for speaker, line in pair.items())
 
 def format_json(input_str: str) -> str:
-    json_blocks = re.findall(r'\[\s*{.*?}\s*\]', input_str, re.DOTALL)
-    combined_dialogs = []
-    formatted_str = ''
-
-    for block in json_blocks:
-        try:
-            parsed = json.loads(block)
-            combined_dialogs.extend(parsed)
-        except Exception as e:
-            print(f"Skipped malformed block: {e}")
-
-    for pair in combined_dialogs:
-        for speaker, line in pair.items():
-            formatted_str += f"{speaker}: {line}\n\n"
-
-    return formatted_str
+    return format_exchanges(parse_dialogue(input_str))
+
+def lazy_singleton(factory):
+    """Defer a zero-argument factory until first use and share its result.
+
+    The returned getter is thread-safe: concurrent first calls build the
+    object once. `getter.is_initialized()` tells whether it has been built.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.is_initialized = lambda: bool(instance)
+    return get
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import fcntl
+import sqlite3
+import threading
+import numpy as np
+from cache_utils import CACHE_DIR
+from embedding_service import EMBEDDING_DIM
+
+INITIAL_CAPACITY = 1024
+
+class VectorIndex:
+    """Persistent (id, embedding, metadata) store with brute-force top-k search.
+
+    Embeddings live in a memory-mapped float32 matrix (`vectors.f32`) that
+    grows by doubling; a SQLite table maps each id to its row and keeps its
+    metadata. Rows are expected to be unit length, so a query is one
+    matrix-vector product over the mapped file. Re-adding an id overwrites
+    its row in place. Several processes may share one index: rows are
+    allocated inside an immediate SQLite transaction and the file is
+    grown and written under an exclusive file lock.
+    """
+
+    def __init__(self, name, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.dir = os.path.join(CACHE_DIR, "vectors", name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.path = os.path.join(self.dir, "vectors.f32")
+        self._lock_path = os.path.join(self.dir, "vectors.lock")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.dir, "ids.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ids ("
+            " id TEXT PRIMARY KEY, row INTEGER UNIQUE NOT NULL,"
+            " metadata TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._matrix = None
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                self._resize(INITIAL_CAPACITY)
+
+    def _file_lock(self):
+        return _FileLock(self._lock_path)
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def _rows_used(self):
+        return self._conn.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM ids").fetchone()[0]
+
+    def _capacity(self):
+        return os.path.getsize(self.path) // (4 * self.dim)
+
+    def _resize(self, capacity):
+        self._matrix = None
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+
+    def _vectors(self):
+        # Another process may have grown the file; remap when the size changed.
+        capacity = self._capacity()
+        if self._matrix is None or self._matrix.shape[0] != capacity:
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return self._matrix
+
+    def add(self, ids, embeddings, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        now = time.time()
+        with self._lock, self._file_lock():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict(self._conn.execute(
+                    f"SELECT id, row FROM ids WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+                ).fetchall()) if ids else {}
+                next_row = self._rows_used()
+                for item_id in ids:
+                    if item_id not in rows:
+                        rows[item_id] = next_row
+                        next_row += 1
+                if next_row > self._capacity():
+                    capacity = self._capacity()
+                    while capacity < next_row:
+                        capacity *= 2
+                    self._resize(capacity)
+
+                matrix = self._vectors()
+                for item_id, embedding in zip(ids, embeddings):
+                    matrix[rows[item_id]] = embedding
+                matrix.flush()
+                self._conn.executemany(
+                    "INSERT INTO ids (id, row, metadata, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET metadata = excluded.metadata, updated_at = excluded.updated_at",
+                    [(item_id, rows[item_id], json.dumps(metadata), now) for item_id, metadata in zip(ids, metadatas)]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def get(self, ids):
+        """Return {id: (embedding, metadata)} for the ids that are indexed."""
+        if not ids:
+            return {}
+        with self._lock:
+            found = self._conn.execute(
+                f"SELECT id, row, metadata FROM ids WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+            ).fetchall()
+            matrix = self._vectors()
+            return {item_id: (np.array(matrix[row]), json.loads(metadata)) for item_id, row, metadata in found}
+
+    def search(self, query, k=10):
+        """Return the k most similar entries as [(id, score, metadata)], best first."""
+        with self._lock:
+            count = self._rows_used()
+            if count == 0:
+                return []
+            scores = self._vectors()[:count] @ np.asarray(query, dtype=np.float32)
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            placeholders = ','.join('?' * len(top))
+            by_row = {row: (item_id, json.loads(metadata)) for item_id, row, metadata in self._conn.execute(
+                f"SELECT id, row, metadata FROM ids WHERE row IN ({placeholders})", [int(r) for r in top]
+            )}
+        return [(by_row[row][0], float(scores[row]), by_row[row][1]) for row in top if row in by_row]
+
+class _FileLock:
+    """Exclusive flock on `path`, held for the duration of a with-block."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
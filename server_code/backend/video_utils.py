@@ -1,9 +1,152 @@
-import requests
+import json
+import asyncio
+import logging
+import hashlib
 import textwrap
-from utils import format_json
-API_URL = "http://localhost:1234/v1/chat/completions"
+from utils import format_json, format_exchanges, parse_dialogue, DialogueParser
+from concurrent.futures import ThreadPoolExecutor
+from cache_utils import LRUCache, SqliteCache
+from llm_client import get_llm_pool
+from metrics import STAGE_SECONDS
+from token_utils import count_tokens, split_by_tokens, trim_to_tokens
 
-def generate_dialogue_script(transcript: str, topic: str = "Video Topic") -> str:
+log = logging.getLogger(__name__)
+LLM_MODEL = "mythomax-l2-13b"
+COMPLETION_CACHE_TTL_SECONDS = 30 * 24 * 3600
+SCRIPT_FAILED = "Script generation failed."
+# Transcripts longer than this are summarized chunk by chunk before the
+# dialogue prompt is built. Tokens are counted with the LLM tokenizer (token_utils).
+REFERENCE_TOKEN_BUDGET = 1500
+TRANSCRIPT_CHUNK_TOKENS = 1500
+CHUNK_SUMMARY_MAX_TOKENS = 200
+
+# Two tiers: recent completions stay in memory, everything else is read back
+# from disk so identical requests survive restarts and are shared by workers.
+completion_memory_cache = LRUCache(max_entries=256, name="completions_memory")
+completion_disk_cache = SqliteCache("completions", max_entries=5000)
+
+def completion_cache_key(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get_cached_completion(payload):
+    key = completion_cache_key(payload)
+    content = completion_memory_cache.get(key)
+    if content is None:
+        content = completion_disk_cache.get(key)
+        if content is not None:
+            completion_memory_cache.set(key, content)
+    return content
+
+def set_cached_completion(payload, content):
+    key = completion_cache_key(payload)
+    completion_memory_cache.set(key, content)
+    completion_disk_cache.set(key, content, COMPLETION_CACHE_TTL_SECONDS)
+
+def complete(payload, use_cache=True):
+    """Return the completion text for an OpenAI-style chat payload, going through the cache."""
+    content = get_cached_completion(payload) if use_cache else None
+    if content is not None:
+        return content
+    # The pool caps requests in flight across every caller, so nested
+    # fan-outs (scripts x transcript chunks) queue here, not on the servers.
+    response = get_llm_pool().chat(payload)
+    content = response["choices"][0]["message"]["content"].strip()
+    set_cached_completion(payload, content)
+    return content
+
+async def acomplete(payload, use_cache=True):
+    """Async complete(): awaits the LLM without tying up a thread.
+
+    The cache lookup and write hit SQLite, so they run in a worker thread.
+    """
+    content = await asyncio.to_thread(get_cached_completion, payload) if use_cache else None
+    if content is not None:
+        return content
+    response = await get_llm_pool().achat(payload)
+    content = response["choices"][0]["message"]["content"].strip()
+    await asyncio.to_thread(set_cached_completion, payload, content)
+    return content
+
+def split_transcript(transcript: str, max_tokens: int = TRANSCRIPT_CHUNK_TOKENS):
+    return split_by_tokens(transcript, max_tokens)
+
+def chunk_summary_payload(chunk: str, part: int, parts: int) -> dict:
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": (
+                f"Summarize part {part} of {parts} of a YouTube video transcript. "
+                "List the key points, facts and examples in plain sentences, in the order they appear. "
+                f"Stay under {CHUNK_SUMMARY_MAX_TOKENS} tokens.\n\n{chunk}"
+            )}
+        ],
+        "max_tokens": CHUNK_SUMMARY_MAX_TOKENS,
+        "temperature": 0.2,
+        "top_p": 0.95
+    }
+
+def chunk_summary_fallback(chunk: str, part: int, parts: int, error) -> str:
+    log.error("LLM error while summarizing part %d/%d: %s", part, parts, error)
+    # Keep the start of the chunk rather than losing the section entirely.
+    return textwrap.shorten(chunk, width=CHUNK_SUMMARY_MAX_TOKENS * 4, placeholder="...")
+
+def summarize_chunk(chunk: str, part: int, parts: int, use_cache: bool = True) -> str:
+    try:
+        with STAGE_SECONDS.time(stage="chunk_summary"):
+            return complete(chunk_summary_payload(chunk, part, parts), use_cache=use_cache)
+    except Exception as e:
+        return chunk_summary_fallback(chunk, part, parts, e)
+
+async def asummarize_chunk(chunk: str, part: int, parts: int, use_cache: bool = True) -> str:
+    try:
+        with STAGE_SECONDS.time(stage="chunk_summary"):
+            return await acomplete(chunk_summary_payload(chunk, part, parts), use_cache=use_cache)
+    except Exception as e:
+        return chunk_summary_fallback(chunk, part, parts, e)
+
+def condense_transcript(transcript: str, max_tokens: int = REFERENCE_TOKEN_BUDGET, use_cache: bool = True) -> str:
+    """Fit a transcript into the prompt budget without dropping its second half.
+
+    Short transcripts pass through unchanged. Long ones are split into
+    chunks that are summarized in parallel (map), and the ordered summaries
+    become the reference text; if they are still too long the step repeats
+    on the summaries (reduce).
+    """
+    while count_tokens(transcript) > max_tokens:
+        chunks = split_transcript(transcript)
+        if len(chunks) == 1:
+            return trim_to_tokens(transcript, max_tokens)
+        with ThreadPoolExecutor(max_workers=min(get_llm_pool().capacity, len(chunks))) as pool:
+            summaries = list(pool.map(
+                lambda part: summarize_chunk(chunks[part], part + 1, len(chunks), use_cache=use_cache),
+                range(len(chunks))
+            ))
+        transcript = "\n".join(summaries)
+    return transcript
+
+async def acondense_transcript(transcript: str, max_tokens: int = REFERENCE_TOKEN_BUDGET, use_cache: bool = True) -> str:
+    """Async condense_transcript(); chunk summaries are awaited together.
+
+    Tokenizing runs in a worker thread: transcripts come from clients and
+    can be long, and the first call may still be loading the tokenizer.
+    """
+    while await asyncio.to_thread(count_tokens, transcript) > max_tokens:
+        chunks = await asyncio.to_thread(split_transcript, transcript)
+        if len(chunks) == 1:
+            return await asyncio.to_thread(trim_to_tokens, transcript, max_tokens)
+        summaries = await asyncio.gather(*(
+            asummarize_chunk(chunk, part + 1, len(chunks), use_cache=use_cache) for part, chunk in enumerate(chunks)
+        ))
+        transcript = "\n".join(summaries)
+    return transcript
+
+def build_dialogue_payload(transcript: str, topic: str = "Video Topic", use_cache: bool = True) -> dict:
+    return dialogue_payload(condense_transcript(transcript, use_cache=use_cache), topic)
+
+async def abuild_dialogue_payload(transcript: str, topic: str = "Video Topic", use_cache: bool = True) -> dict:
+    return dialogue_payload(await acondense_transcript(transcript, use_cache=use_cache), topic)
+
+def dialogue_payload(reference: str, topic: str = "Video Topic") -> dict:
     prompt = f"""
 You are a scriptwriter creating YouTube video content.
 Write a dialogue-based script between a Human and their AI Sidekick.
@@ -15,7 +158,7 @@ FORMAT:
 SCRIPT CONTROLS:
 - Topic: "{topic}"
 - Use this reference transcript:
-{textwrap.shorten(transcript, width=3000, placeholder="...")}
+{reference}
 - Tone: Human = formal, AI = witty and informative
 - Dialogue ratio: Human ~80%, Bot ~20%
 - Total token budget: ~500
@@ -23,7 +166,7 @@ SCRIPT CONTROLS:
 """
 
     payload = {
-        "model": "mythomax-l2-13b",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": prompt}
         ],
@@ -31,11 +174,137 @@ SCRIPT CONTROLS:
         "temperature": 0.8,
         "top_p": 0.95
     }
+    return payload
+
+def generate_dialogue_script(transcript: str, topic: str = "Video Topic", use_cache: bool = True) -> str:
+    # use_cache=False asks for a fresh sample; the new completion still
+    # replaces the cached one so later cached calls see the latest script.
+    try:
+        with STAGE_SECONDS.time(stage="condense_transcript"):
+            payload = build_dialogue_payload(transcript, topic, use_cache=use_cache)
+        with STAGE_SECONDS.time(stage="dialogue_script"):
+            return format_json(complete(payload, use_cache=use_cache))
+    except Exception as e:
+        log.error("LLM error: %s", e)
+        return SCRIPT_FAILED
+
+async def agenerate_dialogue_script(transcript: str, topic: str = "Video Topic", use_cache: bool = True) -> str:
+    try:
+        with STAGE_SECONDS.time(stage="condense_transcript"):
+            payload = await abuild_dialogue_payload(transcript, topic, use_cache=use_cache)
+        with STAGE_SECONDS.time(stage="dialogue_script"):
+            return format_json(await acomplete(payload, use_cache=use_cache))
+    except Exception as e:
+        log.error("LLM error: %s", e)
+        return SCRIPT_FAILED
+
+def generate_dialogue_scripts(transcripts, max_workers=None, use_cache=True, on_result=None):
+    """Run generate_dialogue_script over many transcripts, at most `max_workers` at a time.
+
+    `max_workers` defaults to the LLM pool's total slot count.
+    Results come back in input order. A failure in one generation yields
+    SCRIPT_FAILED for that entry and does not affect the others.
+    `on_result(index, script)` is called as each script finishes.
+    """
+    def generate(index, transcript):
+        try:
+            script = generate_dialogue_script(transcript, use_cache=use_cache)
+        except Exception as e:
+            log.error("LLM error: %s", e)
+            script = SCRIPT_FAILED
+        if on_result:
+            on_result(index, script)
+        return script
+
+    if not transcripts:
+        return []
+    max_workers = max_workers or get_llm_pool().capacity
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(transcripts)))) as pool:
+        return list(pool.map(generate, range(len(transcripts)), transcripts))
 
+async def agenerate_dialogue_scripts(transcripts, use_cache=True):
+    """Async generate_dialogue_scripts(); the LLM pool's slot limit bounds concurrency."""
+    return list(await asyncio.gather(*(agenerate_dialogue_script(t, use_cache=use_cache) for t in transcripts)))
+
+async def astream_dialogue_script(transcript: str, topic: str = "Video Topic", use_cache: bool = True):
+    """Yield dialogue exchanges ({"Human": ..., "Bot": ...}) as soon as the LLM has written each one.
+
+    Uses the OpenAI-compatible streaming mode (`stream: true`) and parses the
+    partial completion as it arrives. Cached completions are replayed in one go.
+    Raises on transport errors so the caller can report them.
+    """
+    payload = await abuild_dialogue_payload(transcript, topic, use_cache=use_cache)
+    content = await asyncio.to_thread(get_cached_completion, payload) if use_cache else None
+    if content is not None:
+        for exchange in parse_dialogue(content):
+            yield exchange
+        return
+
+    parser = DialogueParser()
+    chunks = []
+    async for delta in get_llm_pool().astream_chat(payload):
+        chunks.append(delta)
+        for exchange in parser.feed(delta):
+            yield exchange
+
+    for exchange in parser.close():
+        yield exchange
+    await asyncio.to_thread(set_cached_completion, payload, ''.join(chunks).strip())
+
+async def astream_dialogue_scripts(videos, use_cache=True):
+    """Stream scripts for [(video_id, transcript), ...] followed by the combined script.
+
+    Yields (event, data) pairs in the order they happen:
+    - ("exchange", {"video_id", "exchange"}) for every parsed exchange,
+      with video_id None for the combined script
+    - ("summary", {"video_id", "summary"}) when a video's script is complete
+    - ("done", {"summaries", "combined_transcript"}) once at the end, in the
+      same shape /api/generate-content returns
+    Per-video generations run concurrently, bounded by the LLM pool's slot
+    limit; a failure only affects that video. Closing the generator early
+    (the client went away) cancels the generations still running.
+    """
+    events = asyncio.Queue()
+    summaries = [None] * len(videos)
+
+    async def run(index, video_id, transcript):
+        exchanges = []
+        try:
+            async for exchange in astream_dialogue_script(transcript, use_cache=use_cache):
+                exchanges.append(exchange)
+                events.put_nowait(("exchange", {"video_id": video_id, "exchange": exchange}))
+            summary = format_exchanges(exchanges)
+        except Exception as e:
+            log.error("LLM error: %s", e)
+            summary = SCRIPT_FAILED
+        summaries[index] = summary
+        events.put_nowait(("summary", {"video_id": video_id, "summary": summary}))
+
+    tasks = [asyncio.create_task(run(index, video_id, transcript))
+             for index, (video_id, transcript) in enumerate(videos)]
+    try:
+        finished = 0
+        while finished < len(videos):
+            event, data = await events.get()
+            finished += event == "summary"
+            yield event, data
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    combined_text = " ".join(s for s in summaries if s != SCRIPT_FAILED)
+    exchanges = []
     try:
-        response = requests.post(API_URL, json=payload)
-        response.raise_for_status()
-        return format_json(response.json()["choices"][0]["message"]["content"].strip())
+        async for exchange in astream_dialogue_script(combined_text, use_cache=use_cache):
+            exchanges.append(exchange)
+            yield "exchange", {"video_id": None, "exchange": exchange}
+        combined_transcript = format_exchanges(exchanges)
     except Exception as e:
-        print(f"LLM error: {e}")
-        return "Script generation failed."
+        log.error("LLM error: %s", e)
+        combined_transcript = SCRIPT_FAILED
+
+    yield "done", {
+        "summaries": [{"video_id": video_id, "summary": summary}
+                      for (video_id, _), summary in zip(videos, summaries)],
+        "combined_transcript": combined_transcript
+    }
@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from cache_utils import SqliteCache
+
+# Quota units charged per call, from the YouTube Data API quota table.
+QUOTA_COSTS = {"search.list": 100, "videos.list": 1}
+SEARCH_TTL_SECONDS = 30 * 60
+VIDEO_DETAILS_TTL_SECONDS = 6 * 3600
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+# The API quota resets at midnight Pacific time.
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+class QuotaExhausted(Exception):
+    pass
+
+class CachedYouTubeClient:
+    """Caching and quota-accounting wrapper around a YouTube Data API client.
+
+    `client` is anything shaped like `googleapiclient.discovery.build('youtube', 'v3')`,
+    so a local stand-in works for tests. Search responses and per-video details
+    are cached with their own TTLs. Every call that reaches the API is charged
+    to a daily quota ledger; once the ledger is spent, or the API reports
+    quotaExceeded, expired cache entries are served instead when
+    `serve_stale` is set, and QuotaExhausted is raised when there are none.
+    """
+
+    def __init__(self, client, cache=None, ledger=None, daily_quota=YOUTUBE_DAILY_QUOTA, serve_stale=True):
+        self.client = client
+        self.cache = cache if cache is not None else SqliteCache("youtube_api")
+        # The ledger is a counter store, so its reads stay out of the cache hit-rate metric.
+        self.ledger = ledger if ledger is not None else SqliteCache("youtube_quota", max_entries=31, record_lookups=False)
+        self.daily_quota = daily_quota
+        self.serve_stale = serve_stale
+        self.calls = {endpoint: 0 for endpoint in QUOTA_COSTS}
+        self.stale_served = 0
+        self._lock = threading.Lock()
+        self._exhausted_on = None
+
+    def _today(self):
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    def quota_used(self):
+        return self.ledger.get(self._today(), default=0)
+
+    def quota_status(self):
+        used = self.quota_used()
+        return {
+            "date": self._today(),
+            "used": used,
+            "limit": self.daily_quota,
+            "remaining": max(0, self.daily_quota - used),
+            "exhausted": self._is_exhausted(0),
+            "calls": dict(self.calls),
+            "stale_served": self.stale_served,
+            "cache": self.cache.stats()
+        }
+
+    def _is_exhausted(self, cost):
+        if self._exhausted_on == self._today():
+            return True
+        return self.quota_used() + cost > self.daily_quota
+
+    def _charge(self, endpoint):
+        with self._lock:
+            self.ledger.incr(self._today(), QUOTA_COSTS[endpoint], 2 * 24 * 3600)
+            self.calls[endpoint] += 1
+
+    def _execute(self, endpoint, request):
+        if self._is_exhausted(QUOTA_COSTS[endpoint]):
+            raise QuotaExhausted(f"YouTube quota exhausted for {self._today()}")
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if e.resp.status == 403 and b"quotaExceeded" in (e.content or b""):
+                self._exhausted_on = self._today()
+                raise QuotaExhausted(f"YouTube API reported quotaExceeded: {e}") from e
+            raise
+        self._charge(endpoint)
+        return response
+
+    def search_list(self, **params):
+        key = "search:" + json.dumps(params, sort_keys=True)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            response = self._execute("search.list", self.client.search().list(**params))
+        except QuotaExhausted:
+            stale = self.cache.get(key, allow_expired=True) if self.serve_stale else None
+            if stale is None:
+                raise
+            self.stale_served += 1
+            return stale
+        self.cache.set(key, response, SEARCH_TTL_SECONDS)
+        return response
+
+    def videos_list(self, part, ids):
+        """Return video resources for `ids` (at most 50), fetching only uncached ones."""
+        items = {}
+        missing = []
+        for video_id in ids:
+            cached = self.cache.get(f"videos:{part}:{video_id}")
+            if cached is not None:
+                items[video_id] = cached
+            else:
+                missing.append(video_id)
+
+        if missing:
+            try:
+                response = self._execute("videos.list", self.client.videos().list(part=part, id=','.join(missing)))
+                for item in response.get('items', []):
+                    items[item['id']] = item
+                    self.cache.set(f"videos:{part}:{item['id']}", item, VIDEO_DETAILS_TTL_SECONDS)
+            except QuotaExhausted:
+                if not self.serve_stale:
+                    raise
+                stale = {}
+                for video_id in missing:
+                    item = self.cache.get(f"videos:{part}:{video_id}", allow_expired=True)
+                    if item is not None:
+                        stale[video_id] = item
+                if not stale and not items:
+                    raise
+                items.update(stale)
+                self.stale_served += len(stale)
+
+        return {"items": [items[video_id] for video_id in ids if video_id in items]}
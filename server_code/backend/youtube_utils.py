@@ -1,83 +1,68 @@
 import os
+import hashlib
+import logging
 import numpy as np
 import isodate
-import google.generativeai as genai
-from sentence_transformers import SentenceTransformer
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
-import requests 
-from video_utils import generate_dialogue_script
+from utils import lazy_singleton
+from embedding_service import get_embedder, EMBEDDING_DIM
+from video_utils import generate_dialogue_scripts
+from youtube_api import CachedYouTubeClient
+from vector_index import VectorIndex
+from transcript_utils import fetch_transcripts, TRANSCRIPT_FETCH_CONCURRENCY, TRANSCRIPT_FETCH_TIMEOUT_SECONDS
+from metrics import STAGE_SECONDS, counter
 
 # Load API keys
 load_dotenv()
+log = logging.getLogger(__name__)
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Setup clients
-youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-genai.configure(api_key=GEMINI_API_KEY)
-# gemini_model = genai.GenerativeModel("gemini-pro")
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Clients are built on first use: importing this module must stay cheap so
+# worker restarts and endpoints that never search don't pay for torch.
+@lazy_singleton
+def get_youtube_api():
+    from googleapiclient.discovery import build
+    youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+    return CachedYouTubeClient(youtube)
+
+@lazy_singleton
+def get_video_index():
+    return VectorIndex("videos")
 
 MIN_TRANSCRIPT_LENGTH = 100
 MIN_VIDEO_DURATION_SECONDS = 4 * 60  # 2 minutes
+# Only this many candidates, ranked on title, description and views, get a
+# transcript fetch and a full-text embedding.
+SEARCH_PRUNE_DEPTH = int(os.getenv("SEARCH_PRUNE_DEPTH", "15"))
+METADATA_RELEVANCE_WEIGHT = 0.7
+# all-MiniLM-L6-v2 reads at most 256 word pieces, so a video is embedded
+# from its first words only; the rest would be tokenized and thrown away.
+VIDEO_EMBEDDING_MAX_WORDS = 256
 
-def get_transcript_text(video_id):
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-        cleaned = [seg['text'] for seg in transcript if seg['text'].strip().lower() not in ['[music]']]
-        return ' '.join(cleaned)
-
-    except (TranscriptsDisabled, NoTranscriptFound):
-        return ""
-    except Exception as e:
-        print(f"[ERROR] Transcript error for {video_id}: {e}")
-        return ""
-
-# def generate_summary(text: str) -> str:
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-
-        prompt = f"Summarize this transcript in 3-5 sentences:\n{text[:10000]}"
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": prompt}
-                    ]
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result["candidates"][0]["content"]["parts"][0]["text"]
-
-    except Exception as e:
-        print(f"[ERROR] Gemini HTTP error: {e}")
-        return "Summary generation failed."
+VIDEO_OUTCOMES = counter("cohost_search_videos_total", "Videos seen by topic searches, by outcome.", ["outcome"])
 
 def parse_duration(duration_str):
     try:
         return isodate.parse_duration(duration_str).total_seconds()
     except Exception as e:
-        print(f"[ERROR] parse_duration error: {e}")
+        log.error("parse_duration error: %s", e)
         return 0
 
+def embed_texts(texts):
+    """Return unit-length float32 embeddings for texts, one row each.
+
+    Goes through the shared embedder, which merges concurrent calls into
+    micro-batches (and may live in a separate embedding service). The model
+    length-sorts each batch to keep padding low. Rows are normalized, so
+    cosine similarity is a plain dot product.
+    """
+    return get_embedder().encode(texts)
+
 def get_top_videos_for_keyword(query, max_results=10):
     all_items = []
     next_page_token = None
     while len(all_items) < max_results:
-        request = youtube.search().list(
+        response = get_youtube_api().search_list(
             part='snippet',
             type='video',
             q=query,
@@ -85,93 +70,319 @@ def get_top_videos_for_keyword(query, max_results=10):
             maxResults=min(50, max_results - len(all_items)),
             pageToken=next_page_token
         )
-        response = request.execute()
         all_items.extend(response['items'])
         next_page_token = response.get('nextPageToken')
         if not next_page_token:
             break
-    print(f"[DEBUG] Fetched {len(all_items)} search results for query '{query}'")
+    log.debug("Fetched %d search results for query '%s'", len(all_items), query)
     return all_items
 
 def get_video_details(video_ids):
     stats = []
     for i in range(0, len(video_ids), 50):
         batch = video_ids[i:i + 50]
-        response = youtube.videos().list(
-            part='snippet,statistics,contentDetails',
-            id=','.join(batch)
-        ).execute()
+        response = get_youtube_api().videos_list('snippet,statistics,contentDetails', batch)
         stats.extend(response['items'])
-    print(f"[DEBUG] Retrieved details for {len(stats)} videos")
+    log.debug("Retrieved details for %d videos", len(stats))
     return stats
 
-def get_top_channels_for_topic(topic: str, top_n: int = 3):
-    print(f"[INFO] Getting top videos for topic: {topic}")
-    search_results = get_top_videos_for_keyword(topic, max_results=50)
+def report_stage(report, stage, done, total):
+    if report:
+        report("stage", {"stage": stage, "done": done, "total": total})
+
+@STAGE_SECONDS.time(stage="topic_search")
+def get_top_channels_for_topic(topic: str, top_n: int = 3,
+                               transcript_workers: int = TRANSCRIPT_FETCH_CONCURRENCY,
+                               transcript_timeout: float = TRANSCRIPT_FETCH_TIMEOUT_SECONDS,
+                               prune_depth: int = SEARCH_PRUNE_DEPTH,
+                               report=None):
+    """Rank the channels behind the most viewed videos for `topic`.
+
+    `report(event, data)`, if given, is called as the pipeline advances:
+    ("stage", {"stage", "done", "total"}) for per-stage progress,
+    ("candidates", [video, ...]) with the shortlist and its metadata-only
+    relevance, ("video", video_info) for each accepted video, before
+    scripts exist, and ("meta", {...}) with candidate counts and the prune
+    depth used.
+    """
+    log.info("Getting top videos for topic: %s", topic)
+    report_stage(report, "search", 0, 1)
+    with STAGE_SECONDS.time(stage="youtube_search"):
+        search_results = get_top_videos_for_keyword(topic, max_results=50)
     video_ids = [item['id']['videoId'] for item in search_results if 'videoId' in item['id']]
-    print(f"[DEBUG] Extracted {len(video_ids)} video IDs")
-    detailed_videos = get_video_details(video_ids)
-    topic_embedding = embedding_model.encode(topic)
+    log.debug("Extracted %d video IDs", len(video_ids))
+    report_stage(report, "search", 1, 1)
+    report_stage(report, "details", 0, len(video_ids))
+    with STAGE_SECONDS.time(stage="video_details"):
+        detailed_videos = get_video_details(video_ids)
+    report_stage(report, "details", len(detailed_videos), len(video_ids))
+    with STAGE_SECONDS.time(stage="topic_embedding"):
+        topic_embedding = embed_texts([topic])[0]
+
+    candidates = eligible_videos(detailed_videos)
+    eligible = len(candidates)
+    with STAGE_SECONDS.time(stage="metadata_prune"):
+        candidates, metadata_relevances = prune_candidates(candidates, topic_embedding, prune_depth)
+    VIDEO_OUTCOMES.inc(eligible - len(candidates), outcome="pruned")
+    if report:
+        report("meta", {"search_results": len(video_ids), "eligible": eligible,
+                        "prune_depth": prune_depth, "shortlisted": len(candidates)})
+        report("candidates", [{**video_record(item), "relevance": relevance, "source": "metadata"}
+                              for item, relevance in zip(candidates, metadata_relevances)])
+
+    fetched = []
+    report_stage(report, "transcripts", 0, len(candidates))
+    def on_transcript(video_id, text):
+        fetched.append(video_id)
+        report_stage(report, "transcripts", len(fetched), len(candidates))
+    with STAGE_SECONDS.time(stage="transcripts"):
+        transcripts = fetch_transcripts([item['id'] for item in candidates],
+                                        max_workers=transcript_workers, timeout=transcript_timeout,
+                                        on_result=on_transcript)
+    log.debug("Fetched transcripts for %d candidates", len(transcripts))
+
+    accepted = accept_videos(candidates, transcripts)
+
+    report_stage(report, "embeddings", 0, len(accepted))
+    with STAGE_SECONDS.time(stage="video_embeddings"):
+        embeddings = embed_videos(accepted)
+    relevances = embeddings @ topic_embedding
+    report_stage(report, "embeddings", len(accepted), len(accepted))
 
     channels = {}
     accepted_videos = 0
 
+    for v, relevance in zip(accepted, relevances):
+        video_info = scored_video(v, relevance)
+        VIDEO_OUTCOMES.inc(outcome="accepted")
+        if report:
+            report("video", {**{k: val for k, val in video_info.items() if k != "transcript"},
+                             "channel_id": v["channel_id"], "channel_title": v["channel_title"]})
+        accepted_videos += 1
+
+        channel_id = v["channel_id"]
+        if channel_id not in channels:
+            channels[channel_id] = {
+                "channel_title": v["channel_title"],
+                "videos": []
+            }
+        channels[channel_id]["videos"].append(video_info)
+
+    log.info("Total accepted videos: %d", accepted_videos)
+    if report:
+        report("meta", {"accepted": accepted_videos})
+
+    ranked = rank_channels(channels, top_n)
+    with STAGE_SECONDS.time(stage="scripts"):
+        attach_scripts(ranked, report=report)
+    return ranked
+
+@STAGE_SECONDS.time(stage="batch_search")
+def get_top_channels_for_topics(topics, top_n: int = 3, prune_depth: int = SEARCH_PRUNE_DEPTH,
+                                transcript_workers: int = TRANSCRIPT_FETCH_CONCURRENCY,
+                                transcript_timeout: float = TRANSCRIPT_FETCH_TIMEOUT_SECONDS):
+    """Run get_top_channels_for_topic for several topics, sharing the per-video work.
+
+    Video ids are pooled across topics, so details are fetched in full
+    50-id batches and each unique video is transcribed, embedded and
+    scripted once. All topics are scored against all videos with one
+    matrix multiply per stage. Returns {"results": [{"keyword", "channels"}],
+    "meta": {...}}.
+    """
+    log.info("Getting top videos for %d topics", len(topics))
+    with STAGE_SECONDS.time(stage="youtube_search"):
+        topic_ids = [list(dict.fromkeys(item['id']['videoId'] for item in get_top_videos_for_keyword(topic, max_results=50)
+                                        if 'videoId' in item['id']))
+                     for topic in topics]
+    unique_ids = list(dict.fromkeys(video_id for ids in topic_ids for video_id in ids))
+    with STAGE_SECONDS.time(stage="video_details"):
+        eligible = {item['id']: item for item in eligible_videos(get_video_details(unique_ids))}
+    with STAGE_SECONDS.time(stage="topic_embedding"):
+        topic_embeddings = embed_texts(list(topics))
+
+    pool = list(eligible)
+    with STAGE_SECONDS.time(stage="metadata_prune"):
+        rows = {video_id: row for row, video_id in enumerate(pool)}
+        metadata_relevances = embed_texts([metadata_text(eligible[video_id]) for video_id in pool]) @ topic_embeddings.T
+        shortlists = []
+        for t, ids in enumerate(topic_ids):
+            items = [eligible[video_id] for video_id in ids if video_id in eligible]
+            kept, _ = prune_candidates(items, None, prune_depth,
+                                       relevances=metadata_relevances[[rows[item['id']] for item in items], t])
+            shortlists.append([item['id'] for item in kept])
+    shortlisted = list(dict.fromkeys(video_id for ids in shortlists for video_id in ids))
+    VIDEO_OUTCOMES.inc(len(pool) - len(shortlisted), outcome="pruned")
+
+    with STAGE_SECONDS.time(stage="transcripts"):
+        transcripts = fetch_transcripts(shortlisted, max_workers=transcript_workers, timeout=transcript_timeout)
+    accepted = accept_videos([eligible[video_id] for video_id in shortlisted], transcripts)
+    with STAGE_SECONDS.time(stage="video_embeddings"):
+        relevances = embed_videos(accepted) @ topic_embeddings.T
+    VIDEO_OUTCOMES.inc(len(accepted), outcome="accepted")
+
+    accepted_rows = {v["video_id"]: row for row, v in enumerate(accepted)}
+    results = []
+    for t, topic in enumerate(topics):
+        channels = {}
+        for video_id in shortlists[t]:
+            if video_id not in accepted_rows:
+                continue
+            v = accepted[accepted_rows[video_id]]
+            channel = channels.setdefault(v["channel_id"], {"channel_title": v["channel_title"], "videos": []})
+            channel["videos"].append(scored_video(v, relevances[accepted_rows[video_id], t]))
+        results.append({"keyword": topic, "channels": rank_channels(channels, top_n)})
+
+    with STAGE_SECONDS.time(stage="scripts"):
+        attach_scripts([channel for result in results for channel in result["channels"]])
+    meta = {
+        "topics": len(topics),
+        "search_results": sum(len(ids) for ids in topic_ids),
+        "unique_videos": len(unique_ids),
+        "detail_batches": -(-len(unique_ids) // 50),
+        "eligible": len(eligible),
+        "prune_depth": prune_depth,
+        "shortlisted": len(shortlisted),
+        "accepted": len(accepted)
+    }
+    log.info("Batch search: %s", meta)
+    return {"results": results, "meta": meta}
+
+def eligible_videos(detailed_videos):
+    """Drop video resources with missing fields or under MIN_VIDEO_DURATION_SECONDS."""
+    candidates = []
     for item in detailed_videos:
         if 'snippet' not in item or 'statistics' not in item or 'contentDetails' not in item:
-            print(f"[SKIP] Missing snippet/statistics/contentDetails in item {item.get('id', 'unknown')}")
+            log.debug("Skipping %s: missing snippet/statistics/contentDetails", item.get('id', 'unknown'))
+            VIDEO_OUTCOMES.inc(outcome="missing_fields")
             continue
 
-        snippet = item['snippet']
-        stats = item['statistics']
-        content_details = item['contentDetails']
-        duration_seconds = parse_duration(content_details.get('duration', 'PT0S'))
+        duration_seconds = parse_duration(item['contentDetails'].get('duration', 'PT0S'))
 
         if duration_seconds < MIN_VIDEO_DURATION_SECONDS:
-            print(f"[SKIP] Video {item['id']} skipped due to short duration: {duration_seconds:.1f}s")
+            log.debug("Skipping %s: short duration %.1fs", item['id'], duration_seconds)
+            VIDEO_OUTCOMES.inc(outcome="short_duration")
             continue
 
+        candidates.append(item)
+    return candidates
+
+def video_record(item, transcript=""):
+    snippet = item['snippet']
+    return {
+        "video_id": item['id'],
+        "title": snippet.get('title', ''),
+        "description": snippet.get('description', ''),
+        "views": int(item['statistics'].get('viewCount', 0)),
+        "channel_id": snippet.get('channelId'),
+        "channel_title": snippet.get('channelTitle', ''),
+        "transcript": transcript
+    }
+
+def accept_videos(candidates, transcripts):
+    """Records for the candidates whose transcript has at least MIN_TRANSCRIPT_LENGTH words."""
+    accepted = []
+    for item in candidates:
         video_id = item['id']
-        title = snippet.get('title', '')
-        description = snippet.get('description', '')
-        views = int(stats.get('viewCount', 0))
-        channel_id = snippet.get('channelId')
-        channel_title = snippet.get('channelTitle', '')
-        transcript = get_transcript_text(video_id)
+        transcript = transcripts.get(video_id, "")
 
         if len(transcript.split()) < MIN_TRANSCRIPT_LENGTH:
-            print(f"[SKIP] Video {video_id} has short/empty transcript: {len(transcript.split())} words")
+            log.debug("Skipping %s: short/empty transcript (%d words)", video_id, len(transcript.split()))
+            VIDEO_OUTCOMES.inc(outcome="short_transcript")
             continue
 
-        combined_text = f"{title} {description} {transcript}"
-        embedding = embedding_model.encode(combined_text)
-        relevance = float(np.dot(embedding, topic_embedding) / (np.linalg.norm(embedding) * np.linalg.norm(topic_embedding)))
+        accepted.append(video_record(item, transcript))
+    return accepted
 
-        summary = generate_dialogue_script(transcript)
-        source = "youtube" if transcript else "ai"
+def scored_video(v, relevance):
+    relevance = float(relevance)
+    log.debug("Accepted video: %s | Views: %d | Relevance: %.3f", v['title'], v['views'], relevance)
+    return {
+        "video_id": v["video_id"],
+        "title": v["title"],
+        "description": v["description"],
+        "views": v["views"],
+        "relevance": relevance,
+        "source": "youtube" if v["transcript"] else "ai",
+        "transcript": v["transcript"]
+    }
 
-        video_info = {
-            "video_id": video_id,
-            "title": title,
-            "description": description,
-            "views": views,
-            "relevance": relevance,
-            "summary": summary,
-            "source": source,
-            "transcript": transcript
-        }
-        print(f"[ACCEPTED] Video: {title} | Views: {views} | Relevance: {relevance:.3f}")
-        accepted_videos += 1
+def metadata_text(item):
+    return f"{item['snippet'].get('title', '')} {item['snippet'].get('description', '')}"
 
-        if channel_id not in channels:
-            channels[channel_id] = {
-                "channel_title": channel_title,
-                "videos": []
-            }
-        channels[channel_id]["videos"].append(video_info)
+def prune_candidates(items, topic_embedding, depth, relevances=None):
+    """Keep the `depth` video resources that look most promising from metadata alone.
+
+    Title and description are embedded in one batch and compared with the
+    topic (or `relevances` is used when already computed); views count in
+    on a log scale relative to the most viewed candidate. Returns the kept
+    items in score order and their title/description relevance.
+    """
+    if not items:
+        return [], []
+    if relevances is None:
+        relevances = embed_texts([metadata_text(item) for item in items]) @ topic_embedding
+    views = np.log1p([int(item['statistics'].get('viewCount', 0)) for item in items])
+    views = views / views.max() if views.max() > 0 else views
+    scores = METADATA_RELEVANCE_WEIGHT * relevances + (1 - METADATA_RELEVANCE_WEIGHT) * views
+    keep = np.argsort(-scores, kind="stable")[:depth]
+    log.debug("Pruned %d of %d candidates on metadata", len(items) - len(keep), len(items))
+    return [items[i] for i in keep], [float(relevances[i]) for i in keep]
+
+def embed_videos(videos):
+    """Embed accepted videos, reusing vectors from the video index when the text is unchanged.
 
-    print(f"[SUMMARY] Total accepted videos: {accepted_videos}")
+    Every video is (re)written to the index afterwards with its latest
+    metadata, so later searches can rank it without refetching anything.
+    """
+    texts = [' '.join(f"{v['title']} {v['description']} {v['transcript']}".split()[:VIDEO_EMBEDDING_MAX_WORDS])
+             for v in videos]
+    hashes = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    index = get_video_index()
+    known = index.get([v["video_id"] for v in videos])
 
-    # Rank channels
+    embeddings = np.zeros((len(videos), EMBEDDING_DIM), dtype=np.float32)
+    missing = []
+    for i, (v, text_hash) in enumerate(zip(videos, hashes)):
+        entry = known.get(v["video_id"])
+        if entry is not None and entry[1].get("text_hash") == text_hash:
+            embeddings[i] = entry[0]
+        else:
+            missing.append(i)
+    if missing:
+        embeddings[missing] = embed_texts([texts[i] for i in missing])
+    log.debug("Reused %d indexed embeddings, encoded %d", len(videos) - len(missing), len(missing))
+
+    if videos:
+        index.add(
+            [v["video_id"] for v in videos],
+            embeddings,
+            [{**{k: v[k] for k in ("title", "description", "views", "channel_id", "channel_title")},
+              "text_hash": text_hash} for v, text_hash in zip(videos, hashes)]
+        )
+    return embeddings
+
+def rank_known_videos(topic: str, top_n: int = 3, k: int = 50):
+    """Rank channels using only videos already in the local index.
+
+    No YouTube, transcript or LLM calls: the topic is embedded and compared
+    against every indexed video. Returns the same shape as
+    get_top_channels_for_topic, without transcripts or scripts.
+    """
+    topic_embedding = embed_texts([topic])[0]
+    channels = {}
+    for video_id, relevance, meta in get_video_index().search(topic_embedding, k=k):
+        channel = channels.setdefault(meta["channel_id"], {"channel_title": meta["channel_title"], "videos": []})
+        channel["videos"].append({
+            "video_id": video_id,
+            "title": meta["title"],
+            "description": meta["description"],
+            "views": meta["views"],
+            "relevance": relevance,
+            "source": "index"
+        })
+    return rank_channels(channels, top_n)
+
+def rank_channels(channels, top_n):
     scored = []
     for cid, info in channels.items():
         vids = info["videos"]
@@ -188,7 +399,57 @@ def get_top_channels_for_topic(topic: str, top_n: int = 3):
             "score": score,
             "videos": sorted(vids, key=lambda v: v["views"], reverse=True)[:top_n]
         })
-    print(f"[DEBUG] {len(scored)} channels scored")
-    print(f"[DEBUG] Scored channels: {scored}")
+    log.debug("%d channels scored", len(scored))
+    log.debug("Scored channels: %s", scored)
 
     return sorted(scored, key=lambda x: x["score"], reverse=True)[:top_n]
+
+class ProvisionalRanking:
+    """Channel ranking rebuilt from a search's report events while it runs.
+
+    Ranks the metadata-scored shortlist until accepted videos arrive, then
+    only those. update() returns the new ranking when it differs from the
+    last one returned, None otherwise.
+    """
+
+    def __init__(self, top_n=3):
+        self.top_n = top_n
+        self.candidates = {}
+        self.accepted = {}
+        self._last = None
+
+    def update(self, event, data):
+        if event == "candidates":
+            self.candidates.update((video["video_id"], video) for video in data)
+        elif event == "video":
+            self.accepted[data["video_id"]] = data
+        else:
+            return None
+        channels = {}
+        for video in (self.accepted or self.candidates).values():
+            channel = channels.setdefault(video["channel_id"], {"channel_title": video["channel_title"], "videos": []})
+            channel["videos"].append(video)
+        ranked = rank_channels(channels, self.top_n)
+        signature = [(c["channel_id"], [v["video_id"] for v in c["videos"]]) for c in ranked]
+        if signature == self._last:
+            return None
+        self._last = signature
+        return ranked
+
+def attach_scripts(ranked, report=None):
+    # Dialogue scripts are the most expensive step, so only the videos that
+    # made the final cut get one, and a video ranked more than once (batch
+    # searches) gets a single script.
+    videos = [video for channel in ranked for video in channel["videos"]]
+    unique = list({video["video_id"]: video for video in videos}.values())
+    finished = []
+    report_stage(report, "scripts", 0, len(unique))
+    def on_script(index, script):
+        finished.append(index)
+        report_stage(report, "scripts", len(finished), len(unique))
+    scripts = generate_dialogue_scripts([v["transcript"] for v in unique], on_result=on_script)
+    summaries = {video["video_id"]: summary for video, summary in zip(unique, scripts)}
+    for video in videos:
+        video["summary"] = summaries[video["video_id"]]
+    log.debug("Generated scripts for %d videos", len(unique))
+    return ranked
@@ -6,6 +6,8 @@ import React from 'react';
 export default function HomePage() {
   const [searchQuery, setSearchQuery] = useState('');
   const [videos, setVideos] = useState([]);
+  const [progress, setProgress] = useState('');
+  const [searching, setSearching] = useState(false);
   const navigate = useNavigate();
   useEffect(() => {
     const cached = localStorage.getItem('searchVideos');
@@ -16,20 +18,78 @@ export default function HomePage() {
   
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
+    setSearching(true);
+    setProgress('Searching...');
 
-    const res = await fetch('http://localhost:8000/api/search', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ keyword: searchQuery }),
-    });
+    // The search streams newline-delimited JSON events; show the
+    // provisional ranking as soon as it arrives and replace it at the end.
+    let completed = false;
+    try {
+      const res = await fetch('http://localhost:8000/api/search/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ keyword: searchQuery }),
+      });
+      if (!res.ok || !res.body) {
+        setProgress(`Search failed: HTTP ${res.status}`);
+        return;
+      }
 
-    const data = await res.json();
-    const flatVideos = data.flatMap((channel: any) => channel.videos);
-    setVideos(flatVideos);
-    localStorage.setItem('searchVideos', JSON.stringify(flatVideos));
+      const stages: Record<string, any> = {};
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const { event, data } = JSON.parse(line);
+          if (event === 'stage') {
+            stages[data.stage] = data;
+            setProgress(
+              Object.values(stages)
+                .map((p: any) => `${p.stage} ${p.done}/${p.total}`)
+                .join(' · ')
+            );
+          } else if (event === 'ranking') {
+            setVideos(data.flatMap((channel: any) => channel.videos));
+          } else if (event === 'done') {
+            const flatVideos = data.flatMap((channel: any) => channel.videos);
+            setVideos(flatVideos);
+            localStorage.setItem('searchVideos', JSON.stringify(flatVideos));
+            setProgress('');
+            completed = true;
+            finished = true;
+          } else if (event === 'error') {
+            setProgress(`Search failed: ${data.detail || 'unknown error'}`);
+            finished = true;
+          }
+        }
+      }
+      if (!finished) {
+        setProgress('Search interrupted, please try again.');
+      }
+    } catch (err) {
+      setProgress(`Search failed: ${err instanceof Error ? err.message : 'unknown error'}`);
+    } finally {
+      if (!completed) {
+        // Provisional cards have no transcript or script; go back to the
+        // last complete results instead of leaving them clickable.
+        const cached = localStorage.getItem('searchVideos');
+        setVideos(cached ? JSON.parse(cached) : []);
+      }
+      setSearching(false);
+    }
   };
 
   const handleVideoSelect = (video: any) => {
+    // Provisional results have no transcript or script yet.
+    if (searching || !video.summary) return;
     navigate('/content', { state: { video,allVideos:videos }});
   };
 
@@ -50,12 +110,14 @@ export default function HomePage() {
         </div>
       </form>
 
+      {progress && <p className="text-sm text-gray-500 mb-4">{progress}</p>}
+
       <div className="grid grid-cols-1 md:grid-cols-2 gap-6">
         {videos.map((video: any) => (
           <div
             key={video.video_id}
             onClick={() => handleVideoSelect(video)}
-            className="cursor-pointer bg-white rounded-lg shadow-md p-4 hover:shadow-lg transition"
+            className={`${searching ? 'opacity-60 cursor-wait' : 'cursor-pointer'} bg-white rounded-lg shadow-md p-4 hover:shadow-lg transition`}
           >
             <img
               src={`https://img.youtube.com/vi/${video.video_id}/0.jpg`}
@@ -63,7 +125,7 @@ export default function HomePage() {
             />
             <h3 className="font-bold mt-2">{video.title}</h3>
             <p className="text-xs text-gray-500 mt-1">
-              {video.summary.slice(0, 100)}...
+              {(video.summary || video.description || '').slice(0, 100)}...
             </p>
           </div>
         ))}